@@ -112,6 +112,8 @@ QEMU_RAM=$(calculate_optimal_ram "$HOST_MEM_MB")
 QEMU_SMP=$(calculate_optimal_smp "$HOST_CPUS")
 SERIAL_PORT="${SERIAL_PORT:-5555}"
 MONITOR_PORT="${MONITOR_PORT:-9999}"
+QMP_SOCKET="${QMP_SOCKET:-/tmp/qemu-qmp.sock}"
+HEALTH_DAEMON="${HEALTH_DAEMON:-1}"
 
 log_info "Optimized settings: ${QEMU_SMP} CPUs, ${QEMU_RAM} MB RAM"
 
@@ -260,6 +262,7 @@ build_qemu_command() {
     cmd+=(
         -serial "telnet:0.0.0.0:${SERIAL_PORT},server,nowait"
         -monitor "telnet:0.0.0.0:${MONITOR_PORT},server,nowait"
+        -qmp "unix:${QMP_SOCKET},server,nowait"
     )
 
     # Display options
@@ -283,6 +286,25 @@ build_qemu_command() {
     echo "${cmd[@]}"
 }
 
+# =============================================================================
+# HEALTH DAEMON
+# =============================================================================
+# Start the cached health daemon so HEALTHCHECK does not fork probes each time
+# WHY: health-check.sh asks the daemon first and only falls back to pgrep/nc
+start_health_daemon() {
+    if [ "$HEALTH_DAEMON" != "1" ]; then
+        return 0
+    fi
+    if ! command -v python3 >/dev/null 2>&1; then
+        log_warn "python3 not found - health daemon disabled"
+        return 0
+    fi
+
+    QMP_SOCKET="$QMP_SOCKET" python3 /opt/scripts/health-daemon.py serve \
+        >/var/log/qemu/health-daemon.log 2>&1 &
+    log_info "Health daemon started (PID $!, log: /var/log/qemu/health-daemon.log)"
+}
+
 # =============================================================================
 # MAIN EXECUTION
 # =============================================================================
@@ -316,6 +338,7 @@ main() {
     echo "Management:"
     echo "  - Serial: telnet localhost:${SERIAL_PORT}"
     echo "  - Monitor: telnet localhost:${MONITOR_PORT}"
+    echo "  - QMP: ${QMP_SOCKET}"
     echo ""
     echo "=============================================================================="
     echo ""
@@ -326,6 +349,9 @@ main() {
     mkdir -p /var/log/qemu
     chown -R hurd:hurd /var/log/qemu 2>/dev/null || true
 
+    # Health daemon runs alongside QEMU (survives the exec below)
+    start_health_daemon
+
     # Execute QEMU (run as root for testing - volume permission issues)
     # shellcheck disable=SC2086
     exec $qemu_cmd "$@"
@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+"""
+APT Cache Proxy - Shared Package Cache for Hurd Guests
+
+HTTP forward proxy for guest apt traffic. Every VM would otherwise download
+the same Debian Hurd .deb files again through slirp; this proxy fetches each
+package once, stores it content-addressed on disk and serves repeats from
+the cache.
+
+- Immutable files (.deb, .udeb, .dsc, source tarballs, by-hash indices) are
+  cached; everything else (InRelease, Packages) is passed through
+- Blobs are stored by SHA-256, so identical files from different mirrors or
+  suites are stored once
+- The cache is size-bounded with least-recently-used eviction
+- A file still being fetched is streamed to every client that asks for it;
+  only one upstream request is made per file
+- There is no authentication: it listens on 127.0.0.1 unless --listen says
+  otherwise, and refuses loopback and link-local targets (including after
+  redirects) so it cannot be used to reach the host's own services
+
+Usage:
+    python3 apt-cache-proxy.py --cache-dir /var/cache/hurd-apt --max-size 20G
+    # In the guest (slirp host address is 10.0.2.2):
+    HURD_APT_PROXY=http://10.0.2.2:3142 ./install-essentials-hurd.sh
+    curl http://127.0.0.1:3142/_stats
+
+Environment Variables:
+    APT_PROXY_LISTEN - host:port to listen on (default: 127.0.0.1:3142)
+    APT_PROXY_CACHE_DIR - Cache directory (default: ~/.cache/hurd-apt-proxy)
+    APT_PROXY_MAX_SIZE - Cache size limit, e.g. 500M, 20G (default: 10G)
+    APT_PROXY_TIMEOUT - Upstream timeout in seconds (default: 60)
+"""
+
+import argparse
+import fcntl
+import hashlib
+import ipaddress
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, BinaryIO, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+CHUNK_SIZE = 64 * 1024
+
+# Files whose content never changes for a given URL
+CACHEABLE_SUFFIXES = (
+    ".deb",
+    ".udeb",
+    ".dsc",
+    ".tar.gz",
+    ".tar.xz",
+    ".tar.bz2",
+    ".diff.gz",
+)
+
+# Request headers forwarded upstream for pass-through requests
+PASSTHROUGH_HEADERS = (
+    "If-Modified-Since",
+    "If-None-Match",
+    "If-Range",
+    "Range",
+    "User-Agent",
+)
+
+# Response headers relayed back for pass-through requests (Content-Range and
+# Accept-Ranges matter for 206/416 replies when apt resumes a download)
+RELAY_HEADERS = (
+    "Content-Type",
+    "Content-Length",
+    "Content-Range",
+    "Content-Encoding",
+    "Accept-Ranges",
+    "Last-Modified",
+    "ETag",
+)
+
+
+def parse_size(text: str) -> int:
+    """Parse a size such as 500M or 20G into bytes"""
+    text = text.strip().upper()
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def is_cacheable(url: str) -> bool:
+    """Whether a URL names an immutable archive file"""
+    path = urlsplit(url).path
+    return path.endswith(CACHEABLE_SUFFIXES) or "/by-hash/" in path
+
+
+def blocked_target(url: str) -> Optional[str]:
+    """Reason to refuse proxying to url, or None if it may be fetched
+
+    Loopback, link-local and unspecified addresses are refused so that
+    clients cannot reach services on the proxy host (or cloud metadata
+    endpoints) through it.
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "http" or not parts.hostname:
+        return "only http:// URLs are proxied"
+    try:
+        infos = socket.getaddrinfo(
+            parts.hostname, parts.port or 80, type=socket.SOCK_STREAM
+        )
+    except (OSError, UnicodeError) as e:
+        return f"cannot resolve {parts.hostname}: {e}"
+    for info in infos:
+        addr = ipaddress.ip_address(info[4][0].split("%")[0])
+        if addr.is_loopback or addr.is_link_local or addr.is_unspecified:
+            return f"refusing to proxy to local address {addr}"
+    return None
+
+
+class GuardedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follow redirects only to targets blocked_target() allows"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):  # type: ignore
+        reason = blocked_target(newurl)
+        if reason:
+            raise urllib.error.URLError(f"redirect refused: {reason}")
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+# ---------------------------------------------------------------------------
+# Content-addressed store
+# ---------------------------------------------------------------------------
+
+
+class BlobStore:
+    """Content-addressed blob store with LRU eviction
+
+    Layout:
+        <root>/blobs/<sha[:2]>/<sha>  - file contents
+        <root>/tmp/                   - downloads in progress
+        <root>/index.json             - URL -> sha256, blob LRU order
+        <root>/.lock                  - held while a proxy owns the directory
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        """
+        Initialize store
+
+        Args:
+            root: Cache directory
+            max_bytes: Total blob size limit
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.index_path = os.path.join(root, "index.json")
+        self.keys: Dict[str, str] = {}
+        self.blobs: "OrderedDict[str, int]" = OrderedDict()
+        self.blob_keys: Dict[str, Set[str]] = {}
+        self.total_bytes = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._lock_file = open(os.path.join(root, ".lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise OSError(f"Cache directory in use by another proxy: {root}")
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        self._load()
+
+    def blob_path(self, sha: str) -> str:
+        return os.path.join(self.root, "blobs", sha[:2], sha)
+
+    def _load(self) -> None:
+        """Load the index, dropping entries whose blobs are gone"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+
+        for sha, size in data.get("blobs", []):
+            if os.path.exists(self.blob_path(sha)):
+                self.blobs[sha] = size
+                self.blob_keys[sha] = set()
+                self.total_bytes += size
+        for key, sha in data.get("keys", {}).items():
+            if sha in self.blobs:
+                self.keys[key] = sha
+                self.blob_keys[sha].add(key)
+
+        # Remove blobs the index does not know about (crash mid-save)
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "blobs")):
+            for name in filenames:
+                if name not in self.blobs:
+                    os.unlink(os.path.join(dirpath, name))
+
+    def save(self) -> None:
+        """Write the index atomically if it changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"keys": dict(self.keys), "blobs": list(self.blobs.items())}
+            self.dirty = False
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".index-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.index_path)
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Open the blob for a key and mark it recently used
+
+        Opening under the lock means eviction cannot unlink the blob between
+        lookup and open; once open, the handle stays valid regardless.
+        """
+        with self.lock:
+            sha = self.keys.get(key)
+            if sha is None:
+                return None
+            try:
+                f = open(self.blob_path(sha), "rb")
+            except FileNotFoundError:
+                # Removed behind our back; forget it and refetch
+                self._drop_locked(sha)
+                self.dirty = True
+                return None
+            self.blobs.move_to_end(sha)
+            return f
+
+    def insert(self, key: str, tmp_path: str, sha: str, size: int) -> str:
+        """Move a finished download into the store and return its path
+
+        If the content is already stored under another URL the download is
+        discarded and the key points at the existing blob.
+        """
+        path = self.blob_path(sha)
+        with self.lock:
+            if sha in self.blobs:
+                os.unlink(tmp_path)
+                self.blobs.move_to_end(sha)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                self.blobs[sha] = size
+                self.blob_keys[sha] = set()
+                self.total_bytes += size
+            self.keys[key] = sha
+            self.blob_keys[sha].add(key)
+            self.dirty = True
+            self._evict_locked(keep=sha)
+        return path
+
+    def _evict_locked(self, keep: str) -> None:
+        """Drop least recently used blobs until under the size limit"""
+        while self.total_bytes > self.max_bytes and len(self.blobs) > 1:
+            sha = next(iter(self.blobs))
+            if sha == keep:
+                break
+            self._drop_locked(sha)
+            try:
+                # Readers that already opened the blob keep their handle
+                os.unlink(self.blob_path(sha))
+            except FileNotFoundError:
+                pass
+
+    def _drop_locked(self, sha: str) -> None:
+        """Forget a blob and every key pointing at it"""
+        self.total_bytes -= self.blobs.pop(sha)
+        for key in self.blob_keys.pop(sha, ()):
+            self.keys.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "keys": len(self.keys),
+                "blobs": len(self.blobs),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# ---------------------------------------------------------------------------
+# In-flight downloads
+# ---------------------------------------------------------------------------
+
+
+class Fetch:
+    """One upstream download shared by every client asking for the same URL
+
+    The fetcher thread appends to a temp file; readers open the file and
+    follow it as it grows, waiting on the condition for more data.
+    """
+
+    def __init__(self, key: str, tmp_path: str):
+        self.key = key
+        self.tmp_path = tmp_path
+        self.cond = threading.Condition()
+        self.status: Optional[int] = None
+        self.headers: Dict[str, str] = {}
+        self.length: Optional[int] = None
+        self.written = 0
+        self.done = False
+        self.error: Optional[str] = None
+        self.final_path: Optional[str] = None
+
+    def open_reader(self) -> Optional[BinaryIO]:
+        """Wait for the upstream response and open the download for reading
+
+        The file is opened under the condition, so a failing fetch cannot
+        unlink it in between. Returns None if the fetch failed, or its file
+        is already gone (download failed, or the blob was evicted).
+        """
+        with self.cond:
+            while self.status is None:
+                self.cond.wait()
+            if self.status != 200 or (self.done and self.error):
+                return None
+            try:
+                return open(self.final_path or self.tmp_path, "rb")
+            except FileNotFoundError:
+                return None
+
+    def wait_for(self, offset: int) -> int:
+        """Block until more than offset bytes exist; return bytes available"""
+        with self.cond:
+            while self.written <= offset and not self.done:
+                self.cond.wait()
+            return self.written
+
+
+class CacheProxy:
+    """Cache lookups, single-flight upstream fetches and statistics"""
+
+    def __init__(
+        self, store: BlobStore, timeout: float = 60.0, allow_local: bool = False
+    ):
+        self.store = store
+        self.timeout = timeout
+        self.allow_local = allow_local
+        handlers = [] if allow_local else [GuardedRedirectHandler]
+        self.opener = urllib.request.build_opener(*handlers)
+        self.inflight: Dict[str, Fetch] = {}
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "joined": 0, "passthrough": 0}
+        self.bytes_served = 0
+        self.bytes_fetched = 0
+
+    def check_target(self, url: str) -> Optional[str]:
+        """Reason to refuse url, or None (see blocked_target)"""
+        return None if self.allow_local else blocked_target(url)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += n
+
+    def get_or_start(self, url: str) -> Tuple[Optional[BinaryIO], Optional[Fetch]]:
+        """Return (cached_file, None) or (None, fetch) for a cacheable URL"""
+        with self.lock:
+            cached = self.store.open(url)
+            if cached is not None:
+                self.counters["hits"] += 1
+                return cached, None
+            fetch = self.inflight.get(url)
+            if fetch is not None:
+                self.counters["joined"] += 1
+                return None, fetch
+            fd, tmp_path = tempfile.mkstemp(dir=self.store.tmp_dir)
+            os.close(fd)
+            fetch = Fetch(url, tmp_path)
+            self.inflight[url] = fetch
+            self.counters["misses"] += 1
+
+        threading.Thread(target=self._download, args=(fetch,), daemon=True).start()
+        return None, fetch
+
+    def _download(self, fetch: Fetch) -> None:
+        """Fetcher thread: stream upstream into the temp file"""
+        digest = hashlib.sha256()
+        try:
+            request = urllib.request.Request(
+                fetch.key, headers={"User-Agent": "hurd-apt-cache"}
+            )
+            with self.opener.open(request, timeout=self.timeout) as response:
+                length = response.headers.get("Content-Length")
+                with fetch.cond:
+                    fetch.status = response.status
+                    fetch.headers = {
+                        "Content-Type": response.headers.get(
+                            "Content-Type", "application/octet-stream"
+                        )
+                    }
+                    fetch.length = int(length) if length else None
+                    fetch.cond.notify_all()
+                with open(fetch.tmp_path, "wb") as out:
+                    while True:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        out.flush()
+                        digest.update(chunk)
+                        with fetch.cond:
+                            fetch.written += len(chunk)
+                            fetch.cond.notify_all()
+            if fetch.length is not None and fetch.written != fetch.length:
+                raise IOError(f"short read: {fetch.written}/{fetch.length} bytes")
+            with fetch.cond:
+                fetch.final_path = self.store.insert(
+                    fetch.key, fetch.tmp_path, digest.hexdigest(), fetch.written
+                )
+            self.count_bytes(fetched=fetch.written)
+        except urllib.error.HTTPError as e:
+            fetch.status = e.code
+            fetch.error = f"upstream returned {e.code}"
+        except (OSError, ValueError) as e:
+            fetch.error = str(e)
+        finally:
+            with self.lock:
+                self.inflight.pop(fetch.key, None)
+            with fetch.cond:
+                if fetch.status is None:
+                    fetch.status = 502
+                fetch.done = True
+                fetch.cond.notify_all()
+            if fetch.error and os.path.exists(fetch.tmp_path):
+                os.unlink(fetch.tmp_path)
+
+    def count_bytes(self, served: int = 0, fetched: int = 0) -> None:
+        with self.lock:
+            self.bytes_served += served
+            self.bytes_fetched += fetched
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            data: Dict[str, Any] = dict(self.counters)
+            data["inflight"] = len(self.inflight)
+            data["bytes_served"] = self.bytes_served
+            data["bytes_fetched"] = self.bytes_fetched
+        data["store"] = self.store.stats()
+        return data
+
+
+# ---------------------------------------------------------------------------
+# HTTP front end
+# ---------------------------------------------------------------------------
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """Forward-proxy request handler"""
+
+    proxy: CacheProxy
+    protocol_version = "HTTP/1.1"
+    server_version = "hurd-apt-cache/1.0"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:  # type: ignore[attr-defined]
+            super().log_message(format, *args)
+
+    def do_GET(self) -> None:
+        if self.path == "/_stats":
+            self._send_json(200, self.proxy.stats())
+            return
+        if not self.path.startswith("http://"):
+            self._send_json(
+                400, {"error": "expected absolute http:// URL (proxy request)"}
+            )
+            return
+        reason = self.proxy.check_target(self.path)
+        if reason:
+            self._send_json(403, {"error": reason})
+            return
+        if is_cacheable(self.path):
+            self._serve_cached()
+        else:
+            self._serve_passthrough()
+
+    def do_CONNECT(self) -> None:
+        self._send_json(
+            501, {"error": "HTTPS tunnelling is not supported; use http:// mirrors"}
+        )
+
+    def _send_json(self, code: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body, sort_keys=True).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _serve_cached(self) -> None:
+        cached, fetch = self.proxy.get_or_start(self.path)
+        if cached is not None:
+            with cached:
+                size = os.fstat(cached.fileno()).st_size
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(size))
+                self.send_header("X-Cache", "HIT")
+                self.end_headers()
+                shutil.copyfileobj(cached, self.wfile, CHUNK_SIZE)
+            self.proxy.count_bytes(served=size)
+            return
+
+        assert fetch is not None
+        reader = fetch.open_reader()
+        if reader is None:
+            status = fetch.status or 502
+            self._send_json(
+                status if status >= 400 else 502,
+                {"error": fetch.error or "download no longer available, retry"},
+            )
+            return
+        self._stream_fetch(fetch, reader)
+
+    def _stream_fetch(self, fetch: Fetch, reader: BinaryIO) -> None:
+        """Follow a download in progress and relay it to this client"""
+        self.send_response(200)
+        self.send_header("Content-Type", fetch.headers.get("Content-Type", ""))
+        if fetch.length is not None:
+            self.send_header("Content-Length", str(fetch.length))
+        else:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.send_header("X-Cache", "MISS")
+        self.end_headers()
+
+        sent = 0
+        with reader as f:
+            while True:
+                available = fetch.wait_for(sent)
+                while sent < available:
+                    chunk = f.read(min(CHUNK_SIZE, available - sent))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+                if fetch.done and sent >= fetch.written:
+                    break
+        if fetch.error:
+            # Headers are gone already; dropping the connection tells apt to retry
+            self.close_connection = True
+        self.proxy.count_bytes(served=sent)
+
+    def _serve_passthrough(self) -> None:
+        """Relay a non-cacheable request without storing it"""
+        self.proxy.count("passthrough")
+        headers = {h: self.headers[h] for h in PASSTHROUGH_HEADERS if h in self.headers}
+        request = urllib.request.Request(self.path, headers=headers)
+        try:
+            response = self.proxy.opener.open(request, timeout=self.proxy.timeout)
+        except urllib.error.HTTPError as e:
+            response = e
+        except (OSError, ValueError) as e:
+            self._send_json(502, {"error": str(e)})
+            return
+
+        with response:
+            self.send_response(response.getcode())
+            for name in RELAY_HEADERS:
+                if response.headers.get(name):
+                    self.send_header(name, response.headers[name])
+            if not response.headers.get("Content-Length"):
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            sent = 0
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                sent += len(chunk)
+        self.proxy.count_bytes(served=sent)
+
+
+def make_server(
+    proxy: CacheProxy, host: str, port: int, verbose: bool = False
+) -> ThreadingHTTPServer:
+    """Build a threaded proxy server bound to host:port"""
+    handler = type("BoundProxyHandler", (ProxyHandler,), {"proxy": proxy})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose  # type: ignore[attr-defined]
+    return server
+
+
+def save_loop(store: BlobStore, interval: float, stop: threading.Event) -> None:
+    """Persist the index periodically"""
+    while not stop.wait(interval):
+        store.save()
+
+
+def main() -> int:
+    """Main entry point"""
+    env = os.environ.get
+    parser = argparse.ArgumentParser(
+        description="Shared apt package cache for Hurd guests"
+    )
+    parser.add_argument(
+        "--listen",
+        default=env("APT_PROXY_LISTEN", "127.0.0.1:3142"),
+        help="host:port; use the docker bridge address or 0.0.0.0 to serve other hosts",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=env(
+            "APT_PROXY_CACHE_DIR", os.path.expanduser("~/.cache/hurd-apt-proxy")
+        ),
+    )
+    parser.add_argument("--max-size", default=env("APT_PROXY_MAX_SIZE", "10G"))
+    parser.add_argument(
+        "--timeout", type=float, default=float(env("APT_PROXY_TIMEOUT", "60"))
+    )
+    parser.add_argument(
+        "--allow-local-targets",
+        action="store_true",
+        help="Allow loopback/link-local upstreams (e.g. a mirror on this host)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Log every request"
+    )
+    opts = parser.parse_args()
+
+    try:
+        host, _, port = opts.listen.rpartition(":")
+        store = BlobStore(opts.cache_dir, parse_size(opts.max_size))
+        proxy = CacheProxy(
+            store, timeout=opts.timeout, allow_local=opts.allow_local_targets
+        )
+        server = make_server(proxy, host or "127.0.0.1", int(port), opts.verbose)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    # docker stop sends SIGTERM; shut down cleanly so the index is saved
+    def on_sigterm(signum: int, frame: Any) -> None:
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+    stop = threading.Event()
+    saver = threading.Thread(target=save_loop, args=(store, 5.0, stop), daemon=True)
+    saver.start()
+
+    stats = store.stats()
+    print(
+        f"APT cache proxy on {opts.listen}, cache {opts.cache_dir} "
+        f"({stats['blobs']} blobs, {stats['bytes'] / (1 << 20):.1f} MiB)",
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        store.save()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
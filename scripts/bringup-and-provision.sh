@@ -12,6 +12,8 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 source "$SCRIPT_DIR/lib/ssh-helpers.sh"
 # shellcheck source=lib/container-helpers.sh
 source "$SCRIPT_DIR/lib/container-helpers.sh"
+# shellcheck source=lib/trace-helpers.sh
+source "$SCRIPT_DIR/lib/trace-helpers.sh"
 
 ROOT_PASS=${ROOT_PASS:-root}
 AGENTS_PASS=${AGENTS_PASS:-agents}
@@ -54,27 +56,34 @@ cleanup() {
 
 trap cleanup EXIT INT TERM
 
+trace_begin "provision:total"
+
 # 1) Boot container
+trace_begin "provision:container-up"
 if ! docker ps --format '{{.Names}}' | grep -q "^${CONTAINER_NAME}$"; then
   docker compose up -d
   CONTAINER_STARTED_BY_SCRIPT=true
   CLEANUP_NEEDED=true
 fi
+trace_end "provision:container-up"
 
+trace_begin "provision:wait-serial"
 echo "Waiting for serial (telnet $HOST:$SERIAL_PORT) ..."
 for _ in {1..120}; do
   if nc -z "$HOST" "$SERIAL_PORT" 2>/dev/null; then break; fi
   sleep 2
 done
+trace_end "provision:wait-serial"
 
 # 2) Enable SSH inside guest and set root password (via serial automation)
 # Enable SSH with password auth
-./scripts/install-ssh-hurd.sh
+trace_run "provision:install-ssh" ./scripts/install-ssh-hurd.sh
 
 # 3) Fix Debian-Ports sources and upgrade
-ROOT_PASS="$ROOT_PASS" ./scripts/fix-sources-hurd.sh -h "$HOST" -p "$SSH_PORT"
+ROOT_PASS="$ROOT_PASS" trace_run "provision:fix-sources" ./scripts/fix-sources-hurd.sh -h "$HOST" -p "$SSH_PORT"
 
 # 4) Create agents sudo user via SSH
+trace_begin "provision:create-agents"
 sshpass -p "$ROOT_PASS" ssh -o StrictHostKeyChecking=no -p "$SSH_PORT" root@"$HOST" bash -s <<EOSSH
 set -e
 id agents >/dev/null 2>&1 || useradd -m -s /bin/bash -G sudo agents
@@ -83,9 +92,11 @@ mkdir -p /etc/sudoers.d
 printf 'agents ALL=(ALL) NOPASSWD:ALL\n' > /etc/sudoers.d/agents
 chmod 0440 /etc/sudoers.d/agents
 EOSSH
+trace_end "provision:create-agents"
 
 # 5) Optional: basic dev toolchain (quick set)
-sshpass -p "$ROOT_PASS" ssh -o StrictHostKeyChecking=no -p "$SSH_PORT" root@"$HOST" \
+trace_run "provision:dev-toolchain" sshpass -p "$ROOT_PASS" ssh -o StrictHostKeyChecking=no -p "$SSH_PORT" root@"$HOST" \
   'apt-get update && DEBIAN_FRONTEND=noninteractive apt-get install -y gcc make git vim openssh-client'
 
+trace_end "provision:total"
 echo "\nProvisioning complete. Try: ssh -p $SSH_PORT root@localhost (pwd: $ROOT_PASS) or agents@$HOST (pwd: $AGENTS_PASS)."
\ No newline at end of file
@@ -23,6 +23,8 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 source "$SCRIPT_DIR/lib/colors.sh"
 # shellcheck source=lib/ssh-helpers.sh
 source "$SCRIPT_DIR/lib/ssh-helpers.sh"
+# shellcheck source=lib/trace-helpers.sh
+source "$SCRIPT_DIR/lib/trace-helpers.sh"
 
 # Track cleanup state
 CLEANUP_NEEDED=false
@@ -77,6 +79,7 @@ if [[ ! $REPLY =~ ^[Yy]$ ]]; then
 fi
 
 # Phase 1: Wait for Hurd to boot and SSH to be available
+trace_begin "setup:boot-wait"
 echo ""
 echo_info "Phase 1: Waiting for GNU/Hurd to boot..."
 echo_info "This may take 2-10 minutes depending on your system"
@@ -110,8 +113,10 @@ if [ "$SSH_READY" = false ]; then
 fi
 
 echo_success "Hurd has booted! SSH is responding"
+trace_end "setup:boot-wait"
 
 # Phase 2: Setup root password
+trace_begin "setup:root-password"
 echo ""
 echo_info "Phase 2: Setting up root password..."
 echo ""
@@ -137,8 +142,10 @@ else
     echo "Then run this script again or run setup manually"
     exit 1
 fi
+trace_end "setup:root-password"
 
 # Phase 3: Create agents user
+trace_begin "setup:agents-user"
 echo ""
 echo_info "Phase 3: Creating agents user..."
 echo ""
@@ -162,8 +169,10 @@ EOSSH
 fi
 
 echo_success "User agents created (password: agents, expires on first login)"
+trace_end "setup:agents-user"
 
 # Phase 4: Copy setup scripts to guest
+trace_begin "setup:mount-9p"
 echo ""
 echo_info "Phase 4: Copying setup scripts to guest via 9p..."
 echo ""
@@ -189,8 +198,10 @@ EOSSH
 fi
 
 echo_success "Setup scripts accessible in guest"
+trace_end "setup:mount-9p"
 
 # Phase 5: Install development tools
+trace_begin "setup:dev-tools"
 echo ""
 echo_info "Phase 5: Installing development tools..."
 echo_warning "This will take 20-30 minutes and install ~1.5 GB of packages"
@@ -279,8 +290,10 @@ else
     echo_error "Check logs above for errors"
     exit 1
 fi
+trace_end "setup:dev-tools"
 
 # Phase 6: Configure shell environment
+trace_begin "setup:shell-config"
 echo ""
 echo_info "Phase 6: Configuring shell environment..."
 echo ""
@@ -319,8 +332,10 @@ echo "Shell environment configured for root and agents"
 EOSSH
 
 echo_success "Shell environment configured"
+trace_end "setup:shell-config"
 
 # Phase 7: Verification
+trace_begin "setup:verify"
 echo ""
 echo_info "Phase 7: Verifying installation..."
 echo ""
@@ -375,6 +390,7 @@ echo "======================================================================"
 EOSSH
 
 echo_success "Verification complete!"
+trace_end "setup:verify"
 
 # Final summary
 echo ""
@@ -7,6 +7,9 @@
 # - Check if SSH port is accessible (guest may still be booting)
 # - Check if HTTP port is accessible
 # - Exit 0 if healthy, exit 1 if unhealthy
+#
+# If the health daemon (scripts/health-daemon.py) is running, its cached
+# result is used and the checks below are skipped; otherwise they run inline.
 # =============================================================================
 
 set -euo pipefail
@@ -26,6 +29,9 @@ readonly EXIT_FAILURE=1
 readonly SSH_PORT=2222
 readonly HTTP_PORT=8080
 
+# Cached health daemon endpoint (started by entrypoint.sh)
+readonly HEALTH_DAEMON_URL="${HEALTH_DAEMON_URL:-http://127.0.0.1:8099/health}"
+
 # Logging functions (adapted to use library functions)
 log_error() {
     echo_error "$1" >&2
@@ -72,9 +78,37 @@ check_http_port() {
     fi
 }
 
+# Ask the health daemon for its cached result
+# Returns 0 if healthy, 1 if unhealthy, 2 if the daemon is not reachable
+check_health_daemon() {
+    local code
+    code=$(curl -s -o /dev/null -w '%{http_code}' --max-time 5 "$HEALTH_DAEMON_URL" 2>/dev/null) || true
+
+    case "$code" in
+        200)
+            log_success "Health daemon reports container healthy"
+            return 0
+            ;;
+        503)
+            log_error "Health daemon reports container unhealthy"
+            return 1
+            ;;
+        *)
+            return 2
+            ;;
+    esac
+}
+
 # Main health check logic
 main() {
     local exit_code=$EXIT_SUCCESS
+    local daemon_status=0
+
+    # Fast path: one HTTP request to the daemon instead of forking each probe
+    check_health_daemon || daemon_status=$?
+    if [ $daemon_status -ne 2 ]; then
+        exit $daemon_status
+    fi
 
     # Critical check: QEMU must be running
     if ! check_qemu_process; then
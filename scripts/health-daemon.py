@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Health Daemon - Cached Health Checks for the Hurd QEMU Container
+
+Runs the container health probes from one long-lived process instead of
+forking pgrep/nc/curl on every Docker HEALTHCHECK:
+
+- QMP: connects to the QEMU QMP socket and runs query-status
+- SSH: reads the SSH banner from the forwarded guest port (2222)
+- HTTP: sends a HEAD request to the forwarded guest port (8080)
+
+The three probes run concurrently on a fixed interval. Results are cached
+and served from memory; a query that finds the cache older than the TTL
+triggers one refresh that all concurrent callers share, so the slow Hurd
+guest never sees more than one probe at a time.
+
+Usage:
+    python3 health-daemon.py serve                      # listen on 127.0.0.1:8099
+    python3 health-daemon.py serve --listen unix:/tmp/hurd-health.sock
+    python3 health-daemon.py query                      # exit 0 healthy, 1 unhealthy
+    python3 health-daemon.py probe                      # one-shot probe, no daemon
+    curl -fsS http://127.0.0.1:8099/health
+
+Endpoints:
+    GET /health         - 200 if all critical checks pass, else 503 (JSON body)
+    GET /health/<check> - 200/503 for a single check (qmp, ssh, http)
+
+Environment Variables:
+    QMP_SOCKET - QMP Unix socket (default: /tmp/qemu-qmp.sock)
+    HEALTH_LISTEN - host:port or unix:/path to serve on (default: 127.0.0.1:8099)
+    HEALTH_HOST - Host the guest ports are forwarded on (default: 127.0.0.1)
+    SSH_PORT - Forwarded SSH port (default: 2222)
+    HTTP_PORT - Forwarded HTTP port (default: 8080)
+    HEALTH_INTERVAL - Seconds between background probes (default: 10)
+    HEALTH_TTL - Max cache age in seconds before a query re-probes (default: 15)
+    HEALTH_TIMEOUT - Per-probe timeout in seconds (default: 5)
+    HEALTH_CRITICAL - Comma-separated checks that decide health (default: qmp)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from hurd_trace import span
+
+# QEMU run states that mean the guest is not coming back on its own
+UNHEALTHY_RUN_STATES = {"internal-error", "io-error", "guest-panicked", "shutdown"}
+
+# Seconds a client may take to send its request before it is dropped
+REQUEST_TIMEOUT = 5.0
+
+Probe = Callable[[], Awaitable[Tuple[bool, str]]]
+
+
+# ---------------------------------------------------------------------------
+# Probes
+# ---------------------------------------------------------------------------
+
+
+async def _qmp_read(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    """Read the next non-event QMP message"""
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("QMP connection closed by peer")
+        obj = json.loads(line)
+        if "event" not in obj:
+            return obj
+
+
+async def probe_qmp(socket_path: str) -> Tuple[bool, str]:
+    """Run query-status over QMP"""
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        greeting = await _qmp_read(reader)
+        if "QMP" not in greeting:
+            return False, f"invalid QMP greeting: {greeting}"
+        for command in ("qmp_capabilities", "query-status"):
+            writer.write(json.dumps({"execute": command}).encode() + b"\n")
+            await writer.drain()
+            response = await _qmp_read(reader)
+            if "error" in response:
+                return False, f"{command} failed: {response['error']}"
+        status = response.get("return", {}).get("status", "unknown")
+        return status not in UNHEALTHY_RUN_STATES, status
+    finally:
+        writer.close()
+
+
+async def probe_ssh(host: str, port: int) -> Tuple[bool, str]:
+    """Read the SSH banner
+
+    slirp accepts forwarded connections even when nothing listens in the
+    guest, so a bare TCP connect (nc -z) is not proof that sshd is up.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        banner = (await reader.readline()).decode(errors="replace").strip()
+        return banner.startswith("SSH-"), banner or "connection closed without banner"
+    finally:
+        writer.close()
+
+
+async def probe_http(host: str, port: int) -> Tuple[bool, str]:
+    """Send a HEAD request and read the status line"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"HEAD / HTTP/1.0\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        status = (await reader.readline()).decode(errors="replace").strip()
+        return (
+            status.startswith("HTTP/"),
+            status or "connection closed without response",
+        )
+    finally:
+        writer.close()
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+
+class HealthCache:
+    """Concurrent probe runner with TTL-cached results"""
+
+    def __init__(
+        self,
+        probes: Dict[str, Probe],
+        critical: List[str],
+        ttl: float = 15.0,
+        timeout: float = 5.0,
+    ):
+        """
+        Initialize cache
+
+        Args:
+            probes: Check name -> coroutine function returning (ok, detail)
+            critical: Checks that must pass for the container to be healthy
+            ttl: Max age in seconds before a query triggers a refresh
+            timeout: Per-probe timeout in seconds
+        """
+        self.probes = probes
+        self.critical = critical
+        self.ttl = ttl
+        self.timeout = timeout
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.updated_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+
+    async def _run_probe(self, name: str, probe: Probe) -> Dict[str, Any]:
+        start = time.monotonic()
+        try:
+            ok, detail = await asyncio.wait_for(probe(), self.timeout)
+        except asyncio.TimeoutError:
+            ok, detail = False, f"timeout after {self.timeout}s"
+        except (OSError, ValueError) as e:
+            ok, detail = False, f"{type(e).__name__}: {e}"
+        return {
+            "ok": ok,
+            "detail": detail,
+            "critical": name in self.critical,
+            "latency_ms": round((time.monotonic() - start) * 1000, 1),
+            "checked_at": time.time(),
+        }
+
+    async def _refresh(self) -> None:
+        with span("health:refresh", cat="health"):
+            names = list(self.probes)
+            results = await asyncio.gather(
+                *(self._run_probe(n, self.probes[n]) for n in names)
+            )
+        self.results = dict(zip(names, results))
+        self.updated_at = time.monotonic()
+
+    async def refresh(self) -> None:
+        """Probe everything once; concurrent callers share the same probe"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh())
+        await asyncio.shield(self._inflight)
+
+    def age(self) -> float:
+        if not self.updated_at:
+            return float("inf")
+        return time.monotonic() - self.updated_at
+
+    async def get(self) -> Dict[str, Any]:
+        """Cached health report, refreshed first if older than the TTL"""
+        if self.age() > self.ttl:
+            await self.refresh()
+        return self.report()
+
+    def report(self, check: Optional[str] = None) -> Dict[str, Any]:
+        """Build the health report from the current cache"""
+        checks = self.results
+        if check is not None:
+            checks = {check: self.results[check]} if check in self.results else {}
+            healthy = bool(checks) and checks[check]["ok"]
+        else:
+            healthy = bool(checks) and all(
+                checks[n]["ok"] for n in self.critical if n in checks
+            )
+        return {
+            "healthy": healthy,
+            "age_s": round(self.age(), 2) if checks else None,
+            "checks": checks,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+
+async def handle_request(
+    cache: HealthCache, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """Minimal HTTP/1.0 handler for GET /health[/<check>]"""
+    try:
+        line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+        request_line = line.decode(errors="replace").split()
+        # Drain headers; the request body is never needed
+        while True:
+            header = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            if header in (b"\r\n", b"\n", b""):
+                break
+
+        path = request_line[1].split("?")[0] if len(request_line) > 1 else ""
+        if path == "/health" or path.startswith("/health/"):
+            await cache.get()
+            check = path.removeprefix("/health").lstrip("/") or None
+            report = cache.report(check)
+            if check is not None and not report["checks"]:
+                code, reason = 404, "Not Found"
+            elif report["healthy"]:
+                code, reason = 200, "OK"
+            else:
+                code, reason = 503, "Service Unavailable"
+            body = json.dumps(report, sort_keys=True).encode()
+        else:
+            code, reason = 404, "Not Found"
+            body = b'{"error": "not found"}'
+
+        writer.write(
+            f"HTTP/1.0 {code} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+
+
+async def probe_loop(cache: HealthCache, interval: float) -> None:
+    """Refresh the cache on a fixed schedule"""
+    while True:
+        await cache.refresh()
+        await asyncio.sleep(interval)
+
+
+def parse_listen(spec: str) -> Tuple[Optional[str], Optional[str], int]:
+    """Parse host:port or unix:/path into (unix_path, host, port)"""
+    if spec.startswith("unix:"):
+        return spec.removeprefix("unix:"), None, 0
+    host, sep, port = spec.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"Invalid listen address: {spec}")
+    return None, host or "127.0.0.1", int(port)
+
+
+async def serve(cache: HealthCache, listen: str, interval: float) -> None:
+    """Run the probe loop and the HTTP endpoint until cancelled"""
+    unix_path, host, port = parse_listen(listen)
+
+    async def handler(r: asyncio.StreamReader, w: asyncio.StreamWriter) -> None:
+        await handle_request(cache, r, w)
+
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+
+    print(f"Health daemon listening on {listen}", file=sys.stderr)
+    loop_task = asyncio.ensure_future(probe_loop(cache, interval))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        loop_task.cancel()
+
+
+async def query(listen: str, path: str, timeout: float) -> Tuple[int, str]:
+    """Fetch a report from a running daemon"""
+    unix_path, host, port = parse_listen(listen)
+    if unix_path:
+        conn = asyncio.open_unix_connection(unix_path)
+    else:
+        conn = asyncio.open_connection(host, port)
+    reader, writer = await asyncio.wait_for(conn, timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.0\r\n\r\n".encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = response.decode(errors="replace").partition("\r\n\r\n")
+    status = head.split(None, 2)
+    if len(status) < 2 or not status[0].startswith("HTTP/") or not status[1].isdigit():
+        if not response:
+            raise ValueError("Health daemon closed the connection without a reply")
+        raise ValueError(f"Malformed reply from health daemon: {head[:80]!r}")
+    return int(status[1]), body
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def build_cache(opts: argparse.Namespace) -> HealthCache:
+    probes: Dict[str, Probe] = {
+        "qmp": lambda: probe_qmp(opts.qmp_socket),
+        "ssh": lambda: probe_ssh(opts.host, opts.ssh_port),
+        "http": lambda: probe_http(opts.host, opts.http_port),
+    }
+    critical = [c.strip() for c in opts.critical.split(",") if c.strip()]
+    unknown = [c for c in critical if c not in probes]
+    if unknown:
+        raise ValueError(f"Unknown critical check(s): {', '.join(unknown)}")
+    return HealthCache(probes, critical, ttl=opts.ttl, timeout=opts.timeout)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    env = os.environ.get
+    parser = argparse.ArgumentParser(
+        description="Cached health checks for the Hurd QEMU container"
+    )
+    parser.add_argument(
+        "action", choices=("serve", "query", "probe"), nargs="?", default="serve"
+    )
+    parser.add_argument("--listen", default=env("HEALTH_LISTEN", "127.0.0.1:8099"))
+    parser.add_argument("--check", help="Query a single check (qmp, ssh, http)")
+    parser.add_argument("--qmp-socket", default=env("QMP_SOCKET", "/tmp/qemu-qmp.sock"))
+    parser.add_argument("--host", default=env("HEALTH_HOST", "127.0.0.1"))
+    parser.add_argument("--ssh-port", type=int, default=int(env("SSH_PORT", "2222")))
+    parser.add_argument("--http-port", type=int, default=int(env("HTTP_PORT", "8080")))
+    parser.add_argument(
+        "--interval", type=float, default=float(env("HEALTH_INTERVAL", "10"))
+    )
+    parser.add_argument("--ttl", type=float, default=float(env("HEALTH_TTL", "15")))
+    parser.add_argument(
+        "--timeout", type=float, default=float(env("HEALTH_TIMEOUT", "5"))
+    )
+    parser.add_argument("--critical", default=env("HEALTH_CRITICAL", "qmp"))
+    return parser
+
+
+def main() -> int:
+    """Main entry point"""
+    opts = build_parser().parse_args()
+    try:
+        if opts.action == "query":
+            path = f"/health/{opts.check}" if opts.check else "/health"
+            code, body = asyncio.run(query(opts.listen, path, opts.timeout))
+            print(body)
+            return 0 if code == 200 else 1
+
+        cache = build_cache(opts)
+        if opts.action == "probe":
+            asyncio.run(cache.refresh())
+            report = cache.report(opts.check)
+            print(json.dumps(report, indent=2, sort_keys=True))
+            return 0 if report["healthy"] else 1
+
+        asyncio.run(serve(cache, opts.listen, opts.interval))
+        return 0
+    except KeyboardInterrupt:
+        return 130
+    except (OSError, ValueError, asyncio.TimeoutError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Hurd Trace - Span Tracing for Bring-up, Provisioning and Tests
+
+Records timed spans from bash scripts (via the CLI) and Python tools (via the
+library API) into an append-only NDJSON trace file, then exports them as a
+Chrome trace / Perfetto JSON file or aggregates per-step timing across runs.
+
+Tracing is disabled unless HURD_TRACE_FILE is set, so instrumented scripts
+pay nothing in normal use.
+
+Usage (CLI):
+    export HURD_TRACE_FILE=logs/trace.ndjson
+    python3 hurd_trace.py begin provision:sources --pid $$
+    python3 hurd_trace.py end provision:sources --pid $$
+    python3 hurd_trace.py run apt-update -- apt-get update
+    python3 hurd_trace.py export -o trace.json logs/trace.ndjson
+    python3 hurd_trace.py summary logs/trace.ndjson
+
+Usage (library):
+    from hurd_trace import span
+
+    with span("qmp:query-status", cat="qmp"):
+        client.execute({"execute": "query-status"})
+
+Environment Variables:
+    HURD_TRACE_FILE - Trace file to append records to (unset = disabled)
+    HURD_TRACE_RUN - Run identifier grouping records (default: <time>-<pid>)
+
+Bash callers pass --ts "$EPOCHREALTIME" so a span does not include the
+interpreter startup of the begin/end processes.
+
+Record format (one JSON object per line):
+    {"ph": "B"|"E"|"X"|"i", "name": str, "cat": str, "ts": usec,
+     "dur": usec (X only), "pid": int, "tid": int, "run": str, "args": {}}
+"""
+
+import argparse
+import atexit
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Library spans are buffered and written in batches of this many records,
+# or sooner once this many seconds have passed since the last write, so a
+# long-running daemon does not hold spans in memory until exit
+FLUSH_EVERY = 256
+FLUSH_INTERVAL = 5.0
+
+
+def now_us() -> float:
+    """Wall-clock timestamp in microseconds (comparable across processes)"""
+    return time.time_ns() / 1000.0
+
+
+def default_run_id() -> str:
+    """Run identifier from HURD_TRACE_RUN, or a fresh one for this process"""
+    return os.getenv("HURD_TRACE_RUN") or f"{int(time.time())}-{os.getpid()}"
+
+
+def append_records(path: str, records: Iterable[Dict[str, Any]]) -> None:
+    """Append records to the trace file
+
+    Each batch is a single O_APPEND write, so concurrent writers (several
+    scripts sharing one trace file) do not interleave partial lines.
+    """
+    data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+    if not data:
+        return
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data.encode())
+    finally:
+        os.close(fd)
+
+
+class Tracer:
+    """Buffered span recorder for Python tools"""
+
+    def __init__(self, path: Optional[str] = None, run_id: Optional[str] = None):
+        """
+        Initialize tracer
+
+        Args:
+            path: Trace file (default: HURD_TRACE_FILE; None disables tracing)
+            run_id: Run identifier (default: HURD_TRACE_RUN or generated)
+        """
+        self.path = path if path is not None else os.getenv("HURD_TRACE_FILE")
+        self.run_id = run_id or default_run_id()
+        self.pid = os.getpid()
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        if self.path:
+            atexit.register(self.flush)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _emit(self, record: Dict[str, Any]) -> None:
+        record.setdefault("pid", self.pid)
+        record.setdefault("tid", threading.get_ident())
+        record["run"] = self.run_id
+        with self._lock:
+            self._buffer.append(record)
+            if (
+                len(self._buffer) >= FLUSH_EVERY
+                or time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+            ):
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._buffer and self.path:
+            append_records(self.path, self._buffer)
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        """Write buffered records to the trace file"""
+        with self._lock:
+            self._flush_locked()
+
+    @contextmanager
+    def span(self, name: str, cat: str = "python", **args: Any) -> Iterator[None]:
+        """Time the enclosed block as one complete ("X") event"""
+        if not self.enabled:
+            yield
+            return
+        ts = now_us()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            dur = (time.perf_counter_ns() - start) / 1000.0
+            self._emit(
+                {
+                    "ph": "X",
+                    "name": name,
+                    "cat": cat,
+                    "ts": ts,
+                    "dur": dur,
+                    "args": args,
+                }
+            )
+
+    def traced(self, name: Optional[str] = None, cat: str = "python") -> Callable:
+        """Decorator form of span(); defaults to the function's qualified name"""
+
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*a: Any, **kw: Any) -> Any:
+                with self.span(span_name, cat=cat):
+                    return func(*a, **kw)
+
+            return wrapper
+
+        return decorator
+
+    def instant(self, name: str, cat: str = "python", **args: Any) -> None:
+        """Record a zero-length marker event"""
+        if self.enabled:
+            self._emit(
+                {
+                    "ph": "i",
+                    "name": name,
+                    "cat": cat,
+                    "ts": now_us(),
+                    "s": "p",
+                    "args": args,
+                }
+            )
+
+
+_default_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer configured from the environment"""
+    global _default_tracer
+    if _default_tracer is None:
+        _default_tracer = Tracer()
+    return _default_tracer
+
+
+def span(name: str, cat: str = "python", **args: Any):
+    """Shortcut for get_tracer().span()"""
+    return get_tracer().span(name, cat=cat, **args)
+
+
+def traced(name: Optional[str] = None, cat: str = "python") -> Callable:
+    """Shortcut for get_tracer().traced()"""
+    return get_tracer().traced(name, cat=cat)
+
+
+# ---------------------------------------------------------------------------
+# Reading, pairing and exporting
+# ---------------------------------------------------------------------------
+
+
+def read_records(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Stream records from trace files, skipping torn or invalid lines"""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def complete_spans(records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Turn B/E pairs into complete ("X") events
+
+    Begin and end records are matched by (run, pid, name), innermost first.
+    A begin without an end (script killed, set -e exit) is closed at the
+    last timestamp seen in its run and marked unterminated.
+    """
+    events: List[Dict[str, Any]] = []
+    open_spans: Dict[Tuple[str, int, str], List[Dict[str, Any]]] = {}
+    last_ts: Dict[str, float] = {}
+
+    for rec in sorted(records, key=lambda r: r.get("ts", 0)):
+        run = rec.get("run", "")
+        ts = rec.get("ts", 0)
+        last_ts[run] = max(last_ts.get(run, ts), ts + rec.get("dur", 0))
+        ph = rec.get("ph")
+        key = (run, rec.get("pid", 0), rec.get("name", ""))
+
+        if ph == "B":
+            open_spans.setdefault(key, []).append(rec)
+        elif ph == "E":
+            stack = open_spans.get(key)
+            if not stack:
+                continue
+            begin = stack.pop()
+            args = dict(begin.get("args") or {})
+            args.update(rec.get("args") or {})
+            event = dict(begin, ph="X", dur=ts - begin["ts"], args=args)
+            events.append(event)
+        else:
+            events.append(rec)
+
+    for stack in open_spans.values():
+        for begin in stack:
+            args = dict(begin.get("args") or {}, unterminated=True)
+            dur = last_ts.get(begin.get("run", ""), begin["ts"]) - begin["ts"]
+            events.append(dict(begin, ph="X", dur=dur, args=args))
+
+    events.sort(key=lambda e: e.get("ts", 0))
+    return events
+
+
+def to_chrome_trace(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build a Chrome trace / Perfetto JSON object
+
+    Each run becomes its own process track (labelled with the run id) so
+    several provisioning runs can be compared side by side.
+    """
+    run_pids: Dict[str, int] = {}
+    trace_events: List[Dict[str, Any]] = []
+
+    for event in events:
+        run = event.get("run", "")
+        if run not in run_pids:
+            run_pids[run] = len(run_pids) + 1
+            trace_events.append(
+                {
+                    "ph": "M",
+                    "name": "process_name",
+                    "pid": run_pids[run],
+                    "tid": 0,
+                    "args": {"name": f"run {run}"},
+                }
+            )
+        out = {k: v for k, v in event.items() if k not in ("run", "pid")}
+        out["pid"] = run_pids[run]
+        # Keep the real process id visible as the thread lane
+        out["tid"] = event.get("tid", event.get("pid", 0))
+        out.setdefault("cat", "trace")
+        trace_events.append(out)
+
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+def summarize(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Aggregate span durations per name across all runs
+
+    Returns rows sorted by total time (descending) with count, run count,
+    total/mean/min/max/p50/p95 in milliseconds.
+    """
+    durations: Dict[str, List[float]] = {}
+    runs: Dict[str, set] = {}
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        name = event.get("name", "")
+        durations.setdefault(name, []).append(event.get("dur", 0) / 1000.0)
+        runs.setdefault(name, set()).add(event.get("run", ""))
+
+    rows = []
+    for name, values in durations.items():
+        values.sort()
+        rows.append(
+            {
+                "name": name,
+                "count": len(values),
+                "runs": len(runs[name]),
+                "total_ms": sum(values),
+                "mean_ms": sum(values) / len(values),
+                "min_ms": values[0],
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "max_ms": values[-1],
+            }
+        )
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(
+        0, min(len(sorted_values) - 1, round(pct / 100.0 * len(sorted_values)) - 1)
+    )
+    return sorted_values[rank]
+
+
+def format_summary(rows: List[Dict[str, Any]]) -> str:
+    """Render summary rows as a fixed-width table"""
+    header = (
+        f"{'STEP':<40} {'N':>4} {'RUNS':>4} {'TOTAL(s)':>10} "
+        f"{'MEAN(s)':>9} {'P50(s)':>9} {'P95(s)':>9} {'MAX(s)':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        lines.append(
+            f"{r['name'][:40]:<40} {r['count']:>4} {r['runs']:>4} "
+            f"{r['total_ms'] / 1000:>10.2f} {r['mean_ms'] / 1000:>9.2f} "
+            f"{r['p50_ms'] / 1000:>9.2f} {r['p95_ms'] / 1000:>9.2f} "
+            f"{r['max_ms'] / 1000:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def parse_args_kv(pairs: List[str]) -> Dict[str, str]:
+    """Parse KEY=VALUE arguments into a dict"""
+    args = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise ValueError(f"Expected KEY=VALUE, got: {pair}")
+        args[key] = value
+    return args
+
+
+def parse_epoch(value: str) -> float:
+    """Parse an epoch timestamp in seconds ($EPOCHREALTIME may use a comma)"""
+    return float(value.replace(",", "."))
+
+
+def cli_record(opts: argparse.Namespace, ph: str) -> int:
+    """Handle begin/end/instant"""
+    path = os.getenv("HURD_TRACE_FILE")
+    if not path:
+        return 0
+    record = {
+        "ph": ph,
+        "name": opts.name,
+        "cat": opts.cat,
+        "ts": opts.ts * 1e6 if opts.ts is not None else now_us(),
+        "pid": opts.pid if opts.pid is not None else os.getppid(),
+        "tid": opts.pid if opts.pid is not None else os.getppid(),
+        "run": default_run_id(),
+        "args": parse_args_kv(opts.arg),
+    }
+    if ph == "i":
+        record["s"] = "p"
+    append_records(path, [record])
+    return 0
+
+
+def cli_run(opts: argparse.Namespace) -> int:
+    """Handle run: time a command and exit with its status"""
+    command = opts.command
+    if command and command[0] == "--":
+        command = command[1:]
+    if not command:
+        print("Error: No command given to run", file=sys.stderr)
+        return 2
+
+    tracer = Tracer()
+    args = parse_args_kv(opts.arg)
+    args["command"] = " ".join(command)
+    returncode = 127
+    try:
+        with tracer.span(opts.name, cat=opts.cat, **args):
+            returncode = subprocess.call(command)
+    except FileNotFoundError:
+        print(f"Error: Command not found: {command[0]}", file=sys.stderr)
+    tracer.flush()
+    return returncode
+
+
+def cli_export(opts: argparse.Namespace) -> int:
+    """Handle export: write Chrome trace JSON"""
+    events = complete_spans(read_records(opts.files))
+    trace = to_chrome_trace(events)
+    if opts.output == "-":
+        json.dump(trace, sys.stdout)
+        sys.stdout.write("\n")
+    else:
+        with open(opts.output, "w", encoding="utf-8") as f:
+            json.dump(trace, f)
+        print(f"Wrote {len(events)} events to {opts.output}", file=sys.stderr)
+        print("Open in https://ui.perfetto.dev or chrome://tracing", file=sys.stderr)
+    return 0
+
+
+def cli_summary(opts: argparse.Namespace) -> int:
+    """Handle summary: aggregate per-step timing"""
+    rows = summarize(complete_spans(read_records(opts.files)))
+    if opts.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(format_summary(rows[: opts.top] if opts.top else rows))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Record and analyse timing spans for Hurd bring-up and provisioning"
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    for action, helptext in (
+        ("begin", "Open a span"),
+        ("end", "Close a span"),
+        ("instant", "Record a marker"),
+    ):
+        p = sub.add_parser(action, help=helptext)
+        p.add_argument("name", help="Span name, e.g. provision:sources")
+        p.add_argument("--cat", default="bash", help="Category (default: bash)")
+        p.add_argument(
+            "--pid", type=int, help="Owning process id (default: parent pid)"
+        )
+        p.add_argument(
+            "--arg", action="append", default=[], help="KEY=VALUE span argument"
+        )
+        p.add_argument(
+            "--ts",
+            type=parse_epoch,
+            help="Event time in epoch seconds, e.g. $EPOCHREALTIME (default: now)",
+        )
+
+    p = sub.add_parser("run", help="Run a command inside a span")
+    p.add_argument("name", help="Span name")
+    p.add_argument("--cat", default="bash", help="Category (default: bash)")
+    p.add_argument("--arg", action="append", default=[], help="KEY=VALUE span argument")
+    p.add_argument("command", nargs=argparse.REMAINDER, help="-- command [args...]")
+
+    p = sub.add_parser("export", help="Export trace files as Chrome trace JSON")
+    p.add_argument("files", nargs="+", help="NDJSON trace files")
+    p.add_argument(
+        "-o", "--output", default="trace.json", help="Output file or - for stdout"
+    )
+
+    p = sub.add_parser("summary", help="Aggregate per-step timing across runs")
+    p.add_argument("files", nargs="+", help="NDJSON trace files")
+    p.add_argument("--json", action="store_true", help="Emit JSON instead of a table")
+    p.add_argument("--top", type=int, default=0, help="Show only the N slowest steps")
+
+    return parser
+
+
+def main() -> int:
+    """Main entry point"""
+    opts = build_parser().parse_args()
+    try:
+        if opts.action == "begin":
+            return cli_record(opts, "B")
+        if opts.action == "end":
+            return cli_record(opts, "E")
+        if opts.action == "instant":
+            return cli_record(opts, "i")
+        if opts.action == "run":
+            return cli_run(opts)
+        if opts.action == "export":
+            return cli_export(opts)
+        return cli_summary(opts)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,8 @@ set -euo pipefail
 # shellcheck source=lib/colors.sh
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 source "$SCRIPT_DIR/lib/colors.sh"
+# shellcheck source=lib/package-helpers.sh
+source "$SCRIPT_DIR/lib/package-helpers.sh"
 
 echo ""
 echo "================================================================"
@@ -39,6 +41,9 @@ fi
 # PHASE 1: UPDATE PACKAGE LISTS
 # ============================================================================
 
+# Use the host package cache when HURD_APT_PROXY is set
+apt_use_proxy || exit 1
+
 echo_info "Updating package lists..."
 if apt-get update; then
     echo_success "Package lists updated"
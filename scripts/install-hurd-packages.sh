@@ -8,6 +8,8 @@ set -euo pipefail
 # shellcheck source=lib/colors.sh
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 source "$SCRIPT_DIR/lib/colors.sh"
+# shellcheck source=lib/package-helpers.sh
+source "$SCRIPT_DIR/lib/package-helpers.sh"
 
 echo ""
 echo "================================================================"
@@ -22,6 +24,9 @@ if [ "$EUID" -ne 0 ]; then
     exit 1
 fi
 
+# Use the host package cache when HURD_APT_PROXY is set
+apt_use_proxy || exit 1
+
 # Update package lists
 echo_info "Updating package lists..."
 apt-get update
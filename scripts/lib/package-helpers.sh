@@ -4,7 +4,7 @@
 # WHY: Eliminate ~200 lines of duplicated apt/package error handling code
 #      across install-essentials-hurd.sh, install-hurd-packages.sh, setup-hurd-dev.sh
 # WHAT: Provides install_packages(), verify_package(), verify_command(),
-#       install_optional(), batch_install(), and check_root() functions
+#       install_optional(), batch_install(), check_root() and apt_use_proxy() functions
 # HOW: Source this file and colors.sh, then use helpers:
 #      source "$(dirname "$0")/lib/colors.sh"
 #      source "$(dirname "$0")/lib/package-helpers.sh"
@@ -27,12 +27,42 @@ check_root() {
 # APT OPERATIONS - Core package management
 # ============================================================================
 
-# Initialize apt with non-interactive frontend
+# Initialize apt with non-interactive frontend (and cache proxy if configured)
 # Usage: apt_init
 apt_init() {
     export DEBIAN_FRONTEND=noninteractive
     export APT_LISTCHANGES_FRONTEND=none
-    return 0
+    apt_use_proxy
+}
+
+# Route apt HTTP downloads through the host package cache
+# (scripts/apt-cache-proxy.py) so a fleet fetches each .deb once
+# Usage: apt_use_proxy [proxy_url]   (default: $HURD_APT_PROXY)
+# Example: HURD_APT_PROXY=http://10.0.2.2:3142 (slirp host address)
+# With no proxy configured, a config left by an earlier run is removed so
+# apt does not keep pointing at a proxy that may no longer be running
+# Returns: 0 on success or when no proxy is configured, 1 on failure
+apt_use_proxy() {
+    local proxy="${1:-${HURD_APT_PROXY:-}}"
+    local conf="/etc/apt/apt.conf.d/01hurd-cache-proxy"
+
+    if [ -z "$proxy" ]; then
+        [ -e "$conf" ] || return 0
+        if rm -f "$conf"; then
+            echo_info "Removed package cache proxy config: $conf"
+            return 0
+        fi
+        echo_error "Failed to remove $conf"
+        return 1
+    fi
+
+    if printf 'Acquire::http::Proxy "%s";\n' "$proxy" > "$conf"; then
+        echo_info "apt downloads go through package cache: $proxy"
+        return 0
+    else
+        echo_error "Failed to write $conf"
+        return 1
+    fi
 }
 
 # Update package lists
@@ -343,7 +373,7 @@ get_package_size() {
 # ============================================================================
 # EXPORT FUNCTIONS for subshells
 # ============================================================================
-export -f check_root apt_init apt_update install_packages install_optional
+export -f check_root apt_init apt_use_proxy apt_update install_packages install_optional
 export -f batch_install verify_package verify_command verify_commands
 export -f verify_packages verify_service is_hurd check_connectivity
 export -f apt_clean count_packages get_package_size 2>/dev/null || true
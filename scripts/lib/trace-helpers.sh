@@ -0,0 +1,85 @@
+#!/usr/bin/env bash
+# lib/trace-helpers.sh - Span tracing for bring-up, provisioning and test phases
+# WHY: Log lines alone cannot show which step of a long provision is slow
+# WHAT: trace_begin, trace_end, trace_run wrappers around scripts/hurd_trace.py
+# HOW: Source this file, then export HURD_TRACE_FILE=<path> to enable tracing.
+#      With HURD_TRACE_FILE unset (or no python3) every function is a no-op.
+#      TRACE_TS=<epoch seconds> overrides the timestamp of trace_begin/trace_end.
+
+TRACE_HELPER="${TRACE_HELPER:-$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)/hurd_trace.py}"
+
+# All scripts in one provisioning run share a run id so their spans line up
+if [ -n "${HURD_TRACE_FILE:-}" ]; then
+    export HURD_TRACE_RUN="${HURD_TRACE_RUN:-$(date +%s)-$$}"
+fi
+
+# Check whether tracing is active
+# Usage: trace_enabled && ...
+trace_enabled() {
+    [ -n "${HURD_TRACE_FILE:-}" ] && command -v python3 >/dev/null 2>&1
+}
+
+# Open a span owned by the calling script
+# Usage: trace_begin <name> [KEY=VALUE...]
+trace_begin() {
+    # Timestamp before starting python3; the record is written in the background
+    local ts="${TRACE_TS:-${EPOCHREALTIME:-}}"
+    trace_enabled || return 0
+    local name="$1"
+    shift
+    local kv
+    local args=()
+    for kv in "$@"; do args+=(--arg "$kv"); done
+    if [ -z "$ts" ]; then
+        # bash < 5: no sub-second clock, python3 takes the timestamp
+        python3 "$TRACE_HELPER" begin "$name" --pid "$$" "${args[@]}" || true
+        return 0
+    fi
+    # Write in the background so python3 startup does not run inside the span
+    python3 "$TRACE_HELPER" begin "$name" --pid "$$" --ts "$ts" "${args[@]}" \
+        </dev/null >/dev/null 2>&1 &
+}
+
+# Close the innermost open span with this name
+# Usage: trace_end <name> [KEY=VALUE...]
+trace_end() {
+    # Timestamp before starting python3, so startup time is not in the span
+    local ts="${TRACE_TS:-${EPOCHREALTIME:-}}"
+    trace_enabled || return 0
+    local name="$1"
+    shift
+    local kv
+    local args=()
+    [ -n "$ts" ] && args+=(--ts "$ts")
+    for kv in "$@"; do args+=(--arg "$kv"); done
+    python3 "$TRACE_HELPER" end "$name" --pid "$$" "${args[@]}" || true
+}
+
+# Run a command inside a span, preserving its exit status
+# Usage: trace_run <name> <command> [args...]
+trace_run() {
+    local name="$1"
+    shift
+    if ! trace_enabled; then
+        "$@"
+        return $?
+    fi
+    local rc=0
+    if [ -z "${EPOCHREALTIME:-}" ]; then
+        # bash < 5: no sub-second clock, timestamps come from python3
+        trace_begin "$name"
+        "$@" || rc=$?
+        trace_end "$name" "exit=$rc"
+        return $rc
+    fi
+    # Time the command alone, then record both ends of the span
+    local start="$EPOCHREALTIME"
+    "$@" || rc=$?
+    local end="$EPOCHREALTIME"
+    TRACE_TS="$start" trace_begin "$name"
+    TRACE_TS="$end" trace_end "$name" "exit=$rc"
+    return $rc
+}
+
+# Export functions for subshells
+export -f trace_enabled trace_begin trace_end trace_run 2>/dev/null || true
@@ -26,6 +26,7 @@ cleanup() {
 trap cleanup EXIT INT TERM
 
 QCOW2_IMAGE="${QCOW2_IMAGE:-debian-hurd-amd64.qcow2}"
+QCOW2_TOOL="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)/qcow2-tool.py"
 
 # Colors
 GREEN='\033[0;32m'
@@ -45,6 +46,10 @@ Commands:
   delete <name>         Delete a snapshot
   info                  Show image information
   backup <dest>         Create full backup copy
+  analyze [opts]        Per-snapshot usage, fragmentation, reclaimable space
+                        (opts: --scan-zeros, --json)
+  compact [opts]        Rewrite image to reclaim space (VM must be stopped)
+                        (opts: --compress, --in-place, --drop-snapshots, --dry-run)
 
 Options:
   -i, --image <path>    Specify QCOW2 image (default: $QCOW2_IMAGE)
@@ -55,6 +60,8 @@ Examples:
   $(basename "$0") create pre-upgrade
   $(basename "$0") restore pre-upgrade
   $(basename "$0") backup /backup/hurd-backup.qcow2
+  $(basename "$0") analyze --scan-zeros
+  $(basename "$0") compact --compress --dry-run
 
 Environment:
   QCOW2_IMAGE          Default QCOW2 image path
@@ -166,6 +173,28 @@ cmd_info() {
     qemu-img info "$QCOW2_IMAGE"
 }
 
+# Check if the qcow2 analysis tool can run
+check_qcow2_tool() {
+    if ! command -v python3 &> /dev/null; then
+        echo -e "${RED}ERROR: python3 not found (required by qcow2-tool.py)${NC}"
+        exit 1
+    fi
+}
+
+# Analyze snapshot usage and reclaimable space
+cmd_analyze() {
+    check_image
+    check_qcow2_tool
+    python3 "$QCOW2_TOOL" analyze "$QCOW2_IMAGE" "$@"
+}
+
+# Compact image (writes <image>.compact.qcow2 unless --in-place)
+cmd_compact() {
+    check_image
+    check_qcow2_tool
+    python3 "$QCOW2_TOOL" compact "$QCOW2_IMAGE" "$@"
+}
+
 # Create backup
 cmd_backup() {
     local dest="$1"
@@ -196,7 +225,8 @@ cmd_backup() {
 
     # Get source size for progress estimation
     local source_size
-    source_size=$(qemu-img info --output=json "$QCOW2_IMAGE" | grep -o '"virtual-size": [0-9]*' | cut -d' ' -f2)
+    source_size=$(qemu-img info --output=json "$QCOW2_IMAGE" \
+        | python3 -c 'import json, sys; print(json.load(sys.stdin)["virtual-size"])')
     local source_size_gb=$((source_size / 1024 / 1024 / 1024))
 
     echo "Virtual size: ${source_size_gb}GB"
@@ -272,6 +302,12 @@ main() {
         backup)
             cmd_backup "$@"
             ;;
+        analyze)
+            cmd_analyze "$@"
+            ;;
+        compact)
+            cmd_compact "$@"
+            ;;
         -h|--help|help)
             usage
             ;;
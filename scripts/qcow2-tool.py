@@ -0,0 +1,788 @@
+#!/usr/bin/env python3
+"""
+QCOW2 Tool - Image Analysis and Parallel Compaction
+
+Reads qcow2 metadata directly (header, snapshot table, L1/L2 tables and
+refcount blocks, memory-mapped) to show where the space in an image goes:
+
+- Per-snapshot cluster usage: clusters unique to the snapshot (freed if it
+  is deleted) and clusters shared with the active image or other snapshots
+- Fragmentation of the active image (host layout vs guest order)
+- Reclaimable space: unreferenced clusters inside the file, snapshot-only
+  clusters and, with --scan-zeros, data clusters the guest has zeroed
+
+Compaction rewrites images with `qemu-img convert` (optionally compressed)
+in a bounded worker pool so a fleet of images is shrunk in parallel.
+
+Usage:
+    python3 qcow2-tool.py analyze debian-hurd-amd64.qcow2
+    python3 qcow2-tool.py analyze --scan-zeros --json images/*.qcow2
+    python3 qcow2-tool.py compact --dry-run images/*.qcow2
+    python3 qcow2-tool.py compact --jobs 4 --compress --in-place images/*.qcow2
+
+Notes:
+    `qemu-img convert` copies only the active image, so compaction skips
+    images with internal snapshots unless --drop-snapshots is given.
+    Run `zerofree` or `fstrim` in the guest first so freed blocks are zero.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import stat
+import struct
+import subprocess
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from hurd_trace import get_tracer, span
+
+QCOW2_MAGIC = 0x514649FB
+
+# Table entry layout (qcow2 spec, docs/interop/qcow2.txt in QEMU)
+L1E_OFFSET_MASK = 0x00FFFFFFFFFFFE00
+L2E_OFFSET_MASK = 0x00FFFFFFFFFFFE00
+REFT_OFFSET_MASK = 0xFFFFFFFFFFFFFE00
+QCOW_OFLAG_COMPRESSED = 1 << 62
+QCOW_OFLAG_ZERO = 1
+
+INCOMPAT_EXTL2 = 1 << 4
+HEADER_EXT_BACKING_FORMAT = 0xE2792ACA
+
+
+def _discard(_value: Any) -> None:
+    """Stand-in for list.append when offsets are not tracked"""
+
+
+class Qcow2Error(Exception):
+    """Raised for files that are not valid or supported qcow2 images"""
+
+
+class Qcow2Image:
+    """Read-only, memory-mapped view of a qcow2 image's metadata"""
+
+    def __init__(self, path: str):
+        """
+        Open and parse the image header
+
+        Args:
+            path: Path to the qcow2 file
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self.file_size = os.fstat(self._file.fileno()).st_size
+        if self.file_size < 72:
+            self._file.close()
+            raise Qcow2Error(f"{path}: file too small for a qcow2 header")
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse_header()
+        except (struct.error, Qcow2Error):
+            self.close()
+            raise
+
+    def __enter__(self) -> "Qcow2Image":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap and close the file"""
+        self.mm.close()
+        self._file.close()
+
+    # -- header ------------------------------------------------------------
+
+    def _parse_header(self) -> None:
+        (
+            magic,
+            self.version,
+            self.backing_file_offset,
+            self.backing_file_size,
+            self.cluster_bits,
+            self.virtual_size,
+            self.crypt_method,
+            self.l1_size,
+            self.l1_table_offset,
+            self.refcount_table_offset,
+            self.refcount_table_clusters,
+            self.nb_snapshots,
+            self.snapshots_offset,
+        ) = struct.unpack_from(">IIQIIQIIQQIIQ", self.mm, 0)
+
+        if magic != QCOW2_MAGIC:
+            raise Qcow2Error(f"{self.path}: not a qcow2 image")
+        if self.version not in (2, 3):
+            raise Qcow2Error(f"{self.path}: unsupported qcow2 version {self.version}")
+
+        self.incompatible_features = 0
+        self.refcount_order = 4
+        self.header_length = 72
+        if self.version == 3:
+            (
+                self.incompatible_features,
+                _compatible,
+                _autoclear,
+                self.refcount_order,
+                self.header_length,
+            ) = struct.unpack_from(">QQQII", self.mm, 72)
+        if self.incompatible_features & INCOMPAT_EXTL2:
+            raise Qcow2Error(f"{self.path}: extended L2 entries are not supported")
+
+        self.cluster_size = 1 << self.cluster_bits
+        self.refcount_bits = 1 << self.refcount_order
+        self.l2_entries = self.cluster_size // 8
+        self.backing_file = None
+        if self.backing_file_offset:
+            self.backing_file = self._string(
+                self.backing_file_offset, self.backing_file_size
+            )
+        self.backing_format = self._header_extension(HEADER_EXT_BACKING_FORMAT)
+
+    def _header_extension(self, ext_type: int) -> Optional[str]:
+        """Return a string header extension, if present"""
+        offset = self.header_length
+        end = (
+            self.cluster_size if self.cluster_size <= self.file_size else self.file_size
+        )
+        while offset + 8 <= end:
+            etype, elen = struct.unpack_from(">II", self.mm, offset)
+            if etype == 0:
+                return None
+            if etype == ext_type:
+                return self._string(offset + 8, elen)
+            offset += 8 + ((elen + 7) & ~7)
+        return None
+
+    def _string(self, offset: int, length: int) -> str:
+        (raw,) = struct.unpack_from(f"{length}s", self.mm, offset)
+        return raw.decode(errors="replace")
+
+    @property
+    def file_clusters(self) -> int:
+        return (self.file_size + self.cluster_size - 1) // self.cluster_size
+
+    def clusters_spanning(self, offset: int, length: int) -> range:
+        """Host cluster indices covering [offset, offset + length)"""
+        return range(
+            offset >> self.cluster_bits, (offset + length - 1 >> self.cluster_bits) + 1
+        )
+
+    # -- snapshots ---------------------------------------------------------
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """Parse the internal snapshot table"""
+        result = []
+        offset = self.snapshots_offset
+        for _ in range(self.nb_snapshots):
+            (
+                l1_offset,
+                l1_size,
+                id_len,
+                name_len,
+                date_sec,
+                _date_nsec,
+                _vm_clock,
+                vm_state_size,
+                extra_len,
+            ) = struct.unpack_from(">QIHHIIQII", self.mm, offset)
+            pos = offset + 40
+            disk_size = self.virtual_size
+            if extra_len >= 16:
+                vm_state_size, disk_size = struct.unpack_from(">QQ", self.mm, pos)
+            pos += extra_len
+            snap_id = self._string(pos, id_len)
+            pos += id_len
+            name = self._string(pos, name_len)
+            pos += name_len
+            result.append(
+                {
+                    "id": snap_id,
+                    "name": name,
+                    "date": date_sec,
+                    "vm_state_size": vm_state_size,
+                    "disk_size": disk_size,
+                    "l1_table_offset": l1_offset,
+                    "l1_size": l1_size,
+                }
+            )
+            offset = (pos + 7) & ~7
+        return result
+
+    # -- mapping -----------------------------------------------------------
+
+    def _table(self, offset: int, count: int) -> Tuple[int, ...]:
+        if offset + count * 8 > self.file_size:
+            raise Qcow2Error(
+                f"{self.path}: table at {offset:#x} extends past end of file"
+            )
+        return struct.unpack_from(f">{count}Q", self.mm, offset)
+
+    def walk(
+        self, l1_offset: int, l1_size: int, guest_size: int, track_offsets: bool = False
+    ) -> Dict[str, Any]:
+        """Collect the host clusters one L1 table (image view) references
+
+        Returns a dict with the set of host clusters (metadata and data),
+        per-type counts and, with track_offsets, the host offsets of
+        standard data clusters in guest order (one entry per guest cluster,
+        for fragmentation; None otherwise). Counts and offsets cover the
+        first guest_size bytes; clusters past it (snapshot VM state) are
+        only added to the host cluster set.
+        """
+        clusters: Set[int] = set(self.clusters_spanning(l1_offset, max(l1_size * 8, 1)))
+        data_offsets: Optional[List[Optional[int]]] = [] if track_offsets else None
+        track = data_offsets.append if data_offsets is not None else _discard
+        counts = Counter()
+        cluster_bits = self.cluster_bits
+        guest_clusters = (guest_size + self.cluster_size - 1) >> cluster_bits
+        csize_shift = 62 - (cluster_bits - 8)
+        csize_mask = (1 << (cluster_bits - 8)) - 1
+        coffset_mask = (1 << csize_shift) - 1
+
+        for l1_index, l1_entry in enumerate(self._table(l1_offset, l1_size)):
+            in_disk = min(
+                self.l2_entries, max(0, guest_clusters - l1_index * self.l2_entries)
+            )
+            l2_offset = l1_entry & L1E_OFFSET_MASK
+            if not l2_offset:
+                counts["unallocated"] += in_disk
+                if data_offsets is not None:
+                    data_offsets.extend([None] * in_disk)
+                continue
+            clusters.add(l2_offset >> cluster_bits)
+            counts["l2_tables"] += 1
+            for index, entry in enumerate(self._table(l2_offset, self.l2_entries)):
+                in_guest = index < in_disk
+                if entry & QCOW_OFLAG_COMPRESSED:
+                    offset = entry & coffset_mask
+                    sectors = (entry >> csize_shift) & csize_mask
+                    end = (offset & ~511) + (sectors + 1) * 512
+                    clusters.update(self.clusters_spanning(offset, end - offset))
+                    if in_guest:
+                        counts["compressed"] += 1
+                        track(None)
+                    continue
+                offset = entry & L2E_OFFSET_MASK
+                if offset:
+                    clusters.add(offset >> cluster_bits)
+                if not in_guest:
+                    continue
+                if entry & QCOW_OFLAG_ZERO:
+                    counts["zero"] += 1
+                elif offset:
+                    counts["data"] += 1
+                    track(offset)
+                    continue
+                else:
+                    counts["unallocated"] += 1
+                track(None)
+
+        return {"clusters": clusters, "counts": counts, "data_offsets": data_offsets}
+
+    def refcounts(self) -> List[int]:
+        """Stored refcount for every host cluster in the file"""
+        entries_per_block = self.cluster_size * 8 // self.refcount_bits
+        table_len = self.refcount_table_clusters * self.cluster_size // 8
+        total = self.file_clusters
+        result = [0] * total
+
+        for index, entry in enumerate(
+            self._table(self.refcount_table_offset, table_len)
+        ):
+            block = entry & REFT_OFFSET_MASK
+            first = index * entries_per_block
+            if first >= total:
+                break
+            if not block:
+                continue
+            count = min(entries_per_block, total - first)
+            end = first + count
+            result[first:end] = self._refcount_block(block, count)
+        return result
+
+    def _refcount_block(self, offset: int, count: int) -> Sequence[int]:
+        bits = self.refcount_bits
+        if bits >= 8:
+            fmt = {8: "B", 16: "H", 32: "I", 64: "Q"}[bits]
+            return struct.unpack_from(f">{count}{fmt}", self.mm, offset)
+        # Sub-byte refcounts are packed least significant bits first
+        per_byte = 8 // bits
+        mask = (1 << bits) - 1
+        (raw,) = struct.unpack_from(
+            f"{(count + per_byte - 1) // per_byte}s", self.mm, offset
+        )
+        return [
+            (raw[i // per_byte] >> (i % per_byte * bits)) & mask for i in range(count)
+        ]
+
+    def refcount_metadata_clusters(self) -> Set[int]:
+        """Clusters used by the refcount table and its blocks"""
+        clusters = set(
+            self.clusters_spanning(
+                self.refcount_table_offset,
+                self.refcount_table_clusters * self.cluster_size,
+            )
+        )
+        table_len = self.refcount_table_clusters * self.cluster_size // 8
+        for entry in self._table(self.refcount_table_offset, table_len):
+            if entry & REFT_OFFSET_MASK:
+                clusters.add((entry & REFT_OFFSET_MASK) >> self.cluster_bits)
+        return clusters
+
+    def is_zero_cluster(self, offset: int) -> bool:
+        """Whether a data cluster's contents are all zero bytes"""
+        end = min(offset + self.cluster_size, self.file_size)
+        return self.mm[offset:end].count(0) == end - offset
+
+
+# ---------------------------------------------------------------------------
+# Analysis
+# ---------------------------------------------------------------------------
+
+
+def fragmentation(
+    data_offsets: List[Optional[int]], cluster_size: int
+) -> Tuple[int, float]:
+    """Count contiguous host runs among allocated guest clusters
+
+    Returns (fragments, ratio) where ratio is the share of guest-adjacent
+    allocated clusters that are not host-adjacent (0.0 = fully sequential).
+    """
+    fragments = 0
+    breaks = 0
+    pairs = 0
+    previous: Optional[int] = None
+    for offset in data_offsets:
+        if offset is None:
+            previous = None
+            continue
+        if previous is None:
+            fragments += 1
+        else:
+            pairs += 1
+            if offset != previous + cluster_size:
+                fragments += 1
+                breaks += 1
+        previous = offset
+    return fragments, (breaks / pairs if pairs else 0.0)
+
+
+def analyze_image(path: str, scan_zeros: bool = False) -> Dict[str, Any]:
+    """Analyze one image; returns a JSON-serializable report"""
+    with span("qcow2:analyze", cat="qcow2", image=path), Qcow2Image(path) as img:
+        cs = img.cluster_size
+        snapshots = img.snapshots()
+
+        views = {
+            "active": img.walk(
+                img.l1_table_offset, img.l1_size, img.virtual_size, track_offsets=True
+            )
+        }
+        for snap in snapshots:
+            views[f"snapshot:{snap['id']}"] = img.walk(
+                snap["l1_table_offset"], snap["l1_size"], snap["disk_size"]
+            )
+
+        # How many image views reference each host cluster
+        users: Counter = Counter()
+        for view in views.values():
+            users.update(view["clusters"])
+
+        snapshot_reports = []
+        for snap in snapshots:
+            view = views[f"snapshot:{snap['id']}"]
+            unique = sum(1 for c in view["clusters"] if users[c] == 1)
+            snapshot_reports.append(
+                {
+                    "id": snap["id"],
+                    "name": snap["name"],
+                    "date": snap["date"],
+                    "vm_state_size": snap["vm_state_size"],
+                    "clusters": len(view["clusters"]),
+                    "unique_clusters": unique,
+                    "shared_clusters": len(view["clusters"]) - unique,
+                    "reclaim_if_deleted": unique * cs,
+                }
+            )
+
+        # Freed by deleting every snapshot: clusters no longer needed by the
+        # active image, including ones shared between several snapshots
+        active_clusters = views["active"]["clusters"]
+        snapshot_only = sum(1 for c in users if c not in active_clusters)
+
+        refcounts = img.refcounts()
+        referenced = sum(1 for r in refcounts if r)
+        reachable = set(users)
+        reachable.add(0)
+        reachable.update(img.refcount_metadata_clusters())
+        if img.nb_snapshots:
+            table_end = snapshot_table_end(img)
+            reachable.update(
+                img.clusters_spanning(
+                    img.snapshots_offset, table_end - img.snapshots_offset
+                )
+            )
+        unaccounted = sum(
+            1 for i, r in enumerate(refcounts) if r and i not in reachable
+        )
+
+        active = views["active"]
+        counts = active["counts"]
+        fragments, frag_ratio = fragmentation(active["data_offsets"], cs)
+
+        zero_data = None
+        if scan_zeros:
+            zero_data = sum(
+                1
+                for off in active["data_offsets"]
+                if off is not None and img.is_zero_cluster(off)
+            )
+
+        free_in_file = img.file_clusters - referenced
+        live_data = counts["data"] + counts["compressed"] - (zero_data or 0)
+        reclaimable = (free_in_file + snapshot_only + (zero_data or 0)) * cs
+
+        return {
+            "path": path,
+            "version": img.version,
+            "cluster_size": cs,
+            "refcount_bits": img.refcount_bits,
+            "virtual_size": img.virtual_size,
+            "file_size": img.file_size,
+            "backing_file": img.backing_file,
+            "backing_format": img.backing_format,
+            "dirty": bool(img.incompatible_features & 1),
+            "corrupt": bool(img.incompatible_features & 2),
+            "clusters": {
+                "file": img.file_clusters,
+                "referenced": referenced,
+                "free_in_file": free_in_file,
+                "unaccounted": unaccounted,
+            },
+            "active": {
+                "data_clusters": counts["data"],
+                "compressed_clusters": counts["compressed"],
+                "zero_clusters": counts["zero"],
+                "unallocated_clusters": counts["unallocated"],
+                "l2_tables": counts["l2_tables"],
+                "zero_data_clusters": zero_data,
+                "fragments": fragments,
+                "fragmentation": round(frag_ratio, 4),
+            },
+            "snapshots": snapshot_reports,
+            "reclaimable": {
+                "free_in_file": free_in_file * cs,
+                "snapshots": snapshot_only * cs,
+                "zero_data": (zero_data or 0) * cs,
+                "total": reclaimable,
+            },
+            "compact_estimate": (live_data + counts["l2_tables"] + 4) * cs,
+        }
+
+
+def snapshot_table_end(img: Qcow2Image) -> int:
+    """File offset just past the snapshot table"""
+    offset = img.snapshots_offset
+    for _ in range(img.nb_snapshots):
+        _, _, id_len, name_len = struct.unpack_from(">QIHH", img.mm, offset)
+        (extra_len,) = struct.unpack_from(">I", img.mm, offset + 36)
+        offset = (offset + 40 + extra_len + id_len + name_len + 7) & ~7
+    return offset
+
+
+def _analyze_safe(args: Tuple[str, bool]) -> Dict[str, Any]:
+    path, scan_zeros = args
+    try:
+        return analyze_image(path, scan_zeros)
+    except (OSError, Qcow2Error, struct.error) as e:
+        return {"path": path, "error": str(e)}
+    finally:
+        # Pool workers exit without running atexit, so write spans now
+        get_tracer().flush()
+
+
+def human(n: Optional[float]) -> str:
+    """Format a byte count"""
+    if n is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(n) < 1024 or unit == "TiB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{int(n)} B"
+        n /= 1024
+    return str(n)
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Render an analysis report for a terminal"""
+    if "error" in report:
+        return f"{report['path']}: ERROR {report['error']}"
+    cs = report["cluster_size"]
+    active = report["active"]
+    clusters = report["clusters"]
+    reclaim = report["reclaimable"]
+    lines = [
+        f"{report['path']}",
+        f"  qcow2 v{report['version']}, cluster {human(cs)}"
+        f", refcount {report['refcount_bits']} bit",
+        f"  virtual size {human(report['virtual_size'])}, file size {human(report['file_size'])}",
+    ]
+    if report["backing_file"]:
+        lines.append(f"  backing file: {report['backing_file']}")
+    if report["dirty"] or report["corrupt"]:
+        lines.append("  WARNING: image is marked dirty/corrupt - run qemu-img check")
+    lines += [
+        "  Active image:",
+        f"    data {human(active['data_clusters'] * cs)}"
+        f", compressed {active['compressed_clusters']} clusters"
+        f", zero {active['zero_clusters']}, L2 tables {active['l2_tables']}",
+        f"    fragments {active['fragments']}"
+        f" ({active['fragmentation'] * 100:.1f}% of adjacent clusters non-contiguous)",
+    ]
+    if active["zero_data_clusters"] is not None:
+        lines.append(f"    zero-filled data {human(active['zero_data_clusters'] * cs)}")
+    if report["snapshots"]:
+        lines.append("  Snapshots:")
+        lines.append(
+            f"    {'ID':<4} {'NAME':<24} {'UNIQUE':>12} {'SHARED':>12} {'VMSTATE':>12}"
+        )
+        for snap in report["snapshots"]:
+            lines.append(
+                f"    {snap['id']:<4} {snap['name'][:24]:<24} "
+                f"{human(snap['unique_clusters'] * cs):>12} "
+                f"{human(snap['shared_clusters'] * cs):>12} "
+                f"{human(snap['vm_state_size']):>12}"
+            )
+    lines += [
+        "  Reclaimable:",
+        f"    unreferenced clusters in file  {human(reclaim['free_in_file'])}",
+        f"    snapshot-only clusters         {human(reclaim['snapshots'])}",
+        f"    zero-filled data               {human(reclaim['zero_data'])}",
+        f"    total                          {human(reclaim['total'])}",
+        f"  Estimated size after compaction: {human(report['compact_estimate'])}",
+    ]
+    if clusters["unaccounted"]:
+        lines.append(
+            f"  NOTE: {clusters['unaccounted']} refcounted clusters not reachable from"
+            " image metadata (leaks or bitmaps; see qemu-img check)"
+        )
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# Compaction
+# ---------------------------------------------------------------------------
+
+
+def compact_output_path(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.compact{ext or '.qcow2'}"
+
+
+def compact_image(
+    path: str,
+    compress: bool = False,
+    in_place: bool = False,
+    drop_snapshots: bool = False,
+    dry_run: bool = False,
+    qemu_img: str = "qemu-img",
+) -> Dict[str, Any]:
+    """Rewrite one image with qemu-img convert"""
+    result: Dict[str, Any] = {"path": path}
+    try:
+        with Qcow2Image(path) as img:
+            nb_snapshots = img.nb_snapshots
+            backing_file = img.backing_file
+            backing_format = img.backing_format
+            result["before"] = img.file_size
+    except (OSError, Qcow2Error, struct.error) as e:
+        return dict(result, status="error", reason=str(e))
+
+    if nb_snapshots and not drop_snapshots:
+        return dict(
+            result,
+            status="skipped",
+            reason=f"{nb_snapshots} internal snapshot(s); use --drop-snapshots",
+        )
+
+    output = path + ".compact-tmp" if in_place else compact_output_path(path)
+    cmd = [qemu_img, "convert", "-O", "qcow2"]
+    if compress:
+        cmd.append("-c")
+    if backing_file:
+        # Keep the backing chain instead of flattening it into the copy
+        cmd += ["-B", backing_file]
+        if backing_format:
+            cmd += ["-F", backing_format]
+    cmd += [path, output]
+    result["command"] = cmd
+
+    if dry_run:
+        return dict(result, status="planned")
+
+    with span("qcow2:compact", cat="qcow2", image=path, compress=compress):
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError as e:
+            return dict(result, status="error", reason=f"cannot run {qemu_img}: {e}")
+    if proc.returncode != 0:
+        if os.path.exists(output):
+            os.unlink(output)
+        return dict(
+            result, status="error", reason=proc.stderr.strip() or "qemu-img failed"
+        )
+
+    if in_place:
+        after = os.path.getsize(output)
+        if after >= result["before"]:
+            os.unlink(output)
+            return dict(
+                result,
+                status="skipped",
+                reason=f"result is not smaller ({human(after)}); original kept",
+            )
+        # qemu-img created the copy with our uid and umask; keep the image's
+        # owner and mode so e.g. the container's hurd user can still open it
+        st = os.stat(path)
+        try:
+            os.chown(output, st.st_uid, st.st_gid)
+            os.chmod(output, stat.S_IMODE(st.st_mode))
+        except OSError as e:
+            os.unlink(output)
+            return dict(
+                result,
+                status="error",
+                reason=f"cannot keep owner/mode ({e}); original kept",
+            )
+        os.replace(output, path)
+        output = path
+    result["output"] = output
+    result["after"] = os.path.getsize(output)
+    return dict(result, status="ok")
+
+
+def format_compact(result: Dict[str, Any]) -> str:
+    status = result["status"]
+    if status == "ok":
+        saved = result["before"] - result["after"]
+        return (
+            f"OK      {result['path']}: {human(result['before'])} -> "
+            f"{human(result['after'])} (saved {human(saved)}) [{result['output']}]"
+        )
+    if status == "planned":
+        return f"PLAN    {result['path']}: {' '.join(result['command'])}"
+    return f"{status.upper():<7} {result['path']}: {result.get('reason', '')}"
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def default_jobs() -> int:
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def cmd_analyze(opts: argparse.Namespace) -> int:
+    work = [(path, opts.scan_zeros) for path in opts.images]
+    if opts.jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=opts.jobs) as pool:
+            reports = list(pool.map(_analyze_safe, work))
+    else:
+        reports = [_analyze_safe(w) for w in work]
+
+    if opts.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print("\n\n".join(format_report(r) for r in reports))
+    return 1 if any("error" in r for r in reports) else 0
+
+
+def cmd_compact(opts: argparse.Namespace) -> int:
+    def run(path: str) -> Dict[str, Any]:
+        return compact_image(
+            path,
+            compress=opts.compress,
+            in_place=opts.in_place,
+            drop_snapshots=opts.drop_snapshots,
+            dry_run=opts.dry_run,
+            qemu_img=opts.qemu_img,
+        )
+
+    failed = False
+    # Bounded pool: each worker is one qemu-img process
+    with ThreadPoolExecutor(max_workers=opts.jobs) as pool:
+        for result in pool.map(run, opts.images):
+            print(format_compact(result), flush=True)
+            failed = failed or result["status"] == "error"
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="qcow2 image analysis and parallel compaction"
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    p = sub.add_parser(
+        "analyze", help="Report cluster usage, snapshots and reclaimable space"
+    )
+    p.add_argument("images", nargs="+", help="qcow2 image files")
+    p.add_argument("--json", action="store_true", help="Emit JSON")
+    p.add_argument(
+        "--scan-zeros",
+        action="store_true",
+        help="Read data clusters to find zero-filled ones",
+    )
+    p.add_argument(
+        "-j", "--jobs", type=int, default=default_jobs(), help="Parallel workers"
+    )
+
+    p = sub.add_parser("compact", help="Rewrite images with qemu-img convert")
+    p.add_argument("images", nargs="+", help="qcow2 image files")
+    p.add_argument(
+        "-c", "--compress", action="store_true", help="Write compressed clusters"
+    )
+    p.add_argument(
+        "--in-place",
+        action="store_true",
+        help="Replace each image (default: write *.compact.qcow2)",
+    )
+    p.add_argument(
+        "--drop-snapshots",
+        action="store_true",
+        help="Compact images with internal snapshots (snapshots are not copied)",
+    )
+    p.add_argument(
+        "--dry-run", action="store_true", help="Show the plan without running it"
+    )
+    p.add_argument(
+        "-j", "--jobs", type=int, default=default_jobs(), help="Parallel workers"
+    )
+    p.add_argument(
+        "--qemu-img", default=os.getenv("QEMU_IMG", "qemu-img"), help="qemu-img binary"
+    )
+    return parser
+
+
+def main() -> int:
+    """Main entry point"""
+    opts = build_parser().parse_args()
+    if opts.jobs < 1:
+        print("Error: --jobs must be at least 1", file=sys.stderr)
+        return 1
+    try:
+        if opts.action == "analyze":
+            return cmd_analyze(opts)
+        return cmd_compact(opts)
+    except KeyboardInterrupt:
+        print("\nInterrupted", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,8 @@ SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 # Source color library
 # shellcheck source=lib/colors.sh
 . "$SCRIPT_DIR/lib/colors.sh"
+# shellcheck source=lib/trace-helpers.sh
+. "$SCRIPT_DIR/lib/trace-helpers.sh"
 
 # Track cleanup state
 CLEANUP_NEEDED=false
@@ -100,7 +102,7 @@ run_tests() {
         # Get test function name and run it
         local func
         func=$(grep -E '^test_[a-z_]+\(\)' "$script" | head -1 | sed 's/().*//')
-        [ -n "$func" ] && $func || failed=$((failed + 1))
+        [ -n "$func" ] && trace_run "test:$phase" $func || failed=$((failed + 1))
     done
     
     echo "$failed:7"
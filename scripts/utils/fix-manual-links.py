@@ -11,15 +11,14 @@ from pathlib import Path
 
 def fix_manual_links():
     docs_root = Path("/home/eirikr/Playground/gnu-hurd-docker/docs")
-    json_path = docs_root / "link-fix-data.json"
-
-    # Load the manual review items
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    manual_items = data.get("manual_review", [])
+    ndjson_path = docs_root / "link-fix-data.ndjson"
     fixes_applied = []
 
+    # Pick the manual review items out of the link-scanner.py stream
+    with open(ndjson_path, "r", encoding="utf-8") as f:
+        records = (json.loads(line) for line in f if line.strip())
+        manual_items = [r for r in records if r.get("kind") == "manual_review"]
+
     for item in manual_items:
         if item.get("reason") != "pattern_not_found":
             continue
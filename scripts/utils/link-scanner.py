@@ -2,23 +2,79 @@
 """
 Link Scanner and Fixer for Consolidated Documentation
 Scans all markdown files for internal links and fixes broken references.
+
+Results are streamed to an NDJSON file (one record per line) while the scan
+runs. Valid links are only counted, never stored; the markdown report is
+built afterwards by reading the stream back.
 """
 
 import os
 import re
 import json
 from pathlib import Path
-from typing import List, Tuple
-from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+from collections import Counter
+
+
+class LinkReporter:
+    """Append-only NDJSON writer for link scan results
+
+    Record kinds: "fixed", "manual_review", "broken" and a final "summary".
+    Valid links only increment a counter.
+    """
+
+    def __init__(self, ndjson_path: Path):
+        self.ndjson_path = ndjson_path
+        self.counts: Counter = Counter()
+        self._fh: Optional[TextIO] = None
+
+    def open(self) -> "LinkReporter":
+        """Truncate the stream file and start writing"""
+        self._fh = open(self.ndjson_path, "w", encoding="utf-8")
+        return self
+
+    def close(self) -> None:
+        """Flush and close the stream file"""
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self) -> "LinkReporter":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def record(self, kind: str, **fields: Any) -> None:
+        """Count a result and, unless it is a valid link, write it out"""
+        self.counts[kind] += 1
+        if kind == "valid":
+            return
+        if not self._fh:
+            raise RuntimeError("Reporter is not open")
+        self._fh.write(json.dumps({"kind": kind, **fields}) + "\n")
+
+    def flush(self) -> None:
+        """Push buffered records to disk (called once per scanned file)"""
+        if self._fh:
+            self._fh.flush()
+
+    def iter_records(self, kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream records back from disk, optionally filtered by kind"""
+        with open(self.ndjson_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if kind is None or item.get("kind") == kind:
+                    yield item
 
 
 class LinkScanner:
-    def __init__(self, docs_root: Path):
+    def __init__(self, docs_root: Path, reporter: LinkReporter):
         self.docs_root = docs_root
+        self.reporter = reporter
         self.all_md_files = set()
-        self.link_report = defaultdict(list)
-        self.fixes_applied = []
-        self.manual_review = []
 
     def scan_files(self):
         """Build index of all markdown files"""
@@ -144,14 +200,7 @@ class LinkScanner:
 
                 # Check if file exists
                 if resolved_path.exists():
-                    self.link_report["valid"].append(
-                        {
-                            "file": str(md_file),
-                            "line": line_num,
-                            "text": link_text,
-                            "url": link_url,
-                        }
-                    )
+                    self.reporter.record("valid")
                 else:
                     broken_links += 1
 
@@ -161,14 +210,13 @@ class LinkScanner:
                         rel_from_docs = resolved_path.relative_to(self.docs_root)
                     except ValueError:
                         # Path is outside docs root
-                        self.link_report["broken"].append(
-                            {
-                                "file": str(md_file),
-                                "line": line_num,
-                                "text": link_text,
-                                "url": link_url,
-                                "reason": "outside_docs_root",
-                            }
+                        self.reporter.record(
+                            "broken",
+                            file=str(md_file),
+                            line=line_num,
+                            text=link_text,
+                            url=link_url,
+                            reason="outside_docs_root",
                         )
                         continue
 
@@ -194,45 +242,41 @@ class LinkScanner:
                                 file_has_changes = True
                                 fixed_links += 1
 
-                                self.fixes_applied.append(
-                                    {
-                                        "file": str(md_file),
-                                        "line": line_num,
-                                        "text": link_text,
-                                        "old_url": link_url,
-                                        "new_url": new_rel_path,
-                                    }
+                                self.reporter.record(
+                                    "fixed",
+                                    file=str(md_file),
+                                    line=line_num,
+                                    text=link_text,
+                                    old_url=link_url,
+                                    new_url=new_rel_path,
                                 )
                             else:
-                                self.manual_review.append(
-                                    {
-                                        "file": str(md_file),
-                                        "line": line_num,
-                                        "text": link_text,
-                                        "url": link_url,
-                                        "suggested": new_rel_path,
-                                        "reason": "pattern_not_found",
-                                    }
+                                self.reporter.record(
+                                    "manual_review",
+                                    file=str(md_file),
+                                    line=line_num,
+                                    text=link_text,
+                                    url=link_url,
+                                    suggested=new_rel_path,
+                                    reason="pattern_not_found",
                                 )
                         except Exception as e:
-                            self.manual_review.append(
-                                {
-                                    "file": str(md_file),
-                                    "line": line_num,
-                                    "text": link_text,
-                                    "url": link_url,
-                                    "reason": f"path_calculation_error: {e}",
-                                }
+                            self.reporter.record(
+                                "manual_review",
+                                file=str(md_file),
+                                line=line_num,
+                                text=link_text,
+                                url=link_url,
+                                reason=f"path_calculation_error: {e}",
                             )
                     else:
-                        self.link_report["broken"].append(
-                            {
-                                "file": str(md_file),
-                                "line": line_num,
-                                "text": link_text,
-                                "url": link_url,
-                                "reason": "file_not_found",
-                            }
+                        self.reporter.record(
+                            "broken",
+                            file=str(md_file),
+                            line=line_num,
+                            text=link_text,
+                            url=link_url,
+                            reason="file_not_found",
                         )
 
             # Write back modified content if changes were made
@@ -244,126 +288,118 @@ class LinkScanner:
                 except Exception as e:
                     print(f"Error writing {md_file}: {e}")
 
+            self.reporter.flush()
+
+        self.reporter.record(
+            "summary",
+            total_links=total_links,
+            broken_links=broken_links,
+            fixed_links=fixed_links,
+            manual_review=self.reporter.counts["manual_review"],
+            valid_links=self.reporter.counts["valid"],
+        )
+        self.reporter.flush()
+
         return total_links, broken_links, fixed_links
 
-    def generate_report(
-        self, total_links: int, broken_links: int, fixed_links: int
-    ) -> str:
-        """Generate markdown report"""
-        report = []
-        report.append("# Link Fix Report")
-        report.append(f"\nGenerated: {Path.cwd()}")
-        report.append("\n## Summary Statistics\n")
-        report.append(f"- Total internal links scanned: {total_links}")
-        report.append(f"- Broken links found: {broken_links}")
-        report.append(f"- Links automatically fixed: {fixed_links}")
-        report.append(f"- Links needing manual review: {len(self.manual_review)}")
-        report.append(f"- Valid links confirmed: {len(self.link_report['valid'])}")
-
-        # Fixed links section
-        if self.fixes_applied:
-            report.append("\n## Successfully Fixed Links\n")
+    def write_report(
+        self, out: TextIO, total_links: int, broken_links: int, fixed_links: int
+    ) -> None:
+        """Write markdown report to out, reading results back from the stream
+
+        Records are already ordered by (file, line) because files are scanned
+        in sorted order, so each section is a single pass over the NDJSON file.
+        """
+        counts = self.reporter.counts
+        out.write("# Link Fix Report\n")
+        out.write(f"\nGenerated: {Path.cwd()}\n")
+        out.write("\n## Summary Statistics\n\n")
+        out.write(f"- Total internal links scanned: {total_links}\n")
+        out.write(f"- Broken links found: {broken_links}\n")
+        out.write(f"- Links automatically fixed: {fixed_links}\n")
+        out.write(f"- Links needing manual review: {counts['manual_review']}\n")
+        out.write(f"- Valid links confirmed: {counts['valid']}\n")
+
+        # Fixed links section; keep the first few fixes for the examples
+        examples = []
+        if counts["fixed"]:
+            out.write("\n## Successfully Fixed Links\n")
             current_file = None
-            for fix in sorted(self.fixes_applied, key=lambda x: (x["file"], x["line"])):
+            for fix in self.reporter.iter_records("fixed"):
+                if len(examples) < 5:
+                    examples.append(fix)
                 if current_file != fix["file"]:
                     current_file = fix["file"]
-                    report.append(f"\n### {current_file}\n")
-                report.append(f"- Line {fix['line']}: `[{fix['text']}]`")
-                report.append(f"  - Old: `{fix['old_url']}`")
-                report.append(f"  - New: `{fix['new_url']}`")
+                    out.write(f"\n### {current_file}\n\n")
+                out.write(f"- Line {fix['line']}: `[{fix['text']}]`\n")
+                out.write(f"  - Old: `{fix['old_url']}`\n")
+                out.write(f"  - New: `{fix['new_url']}`\n")
 
         # Manual review section
-        if self.manual_review:
-            report.append("\n## Links Requiring Manual Review\n")
+        if counts["manual_review"]:
+            out.write("\n## Links Requiring Manual Review\n")
             current_file = None
-            for item in sorted(
-                self.manual_review, key=lambda x: (x["file"], x["line"])
-            ):
+            for item in self.reporter.iter_records("manual_review"):
                 if current_file != item["file"]:
                     current_file = item["file"]
-                    report.append(f"\n### {current_file}\n")
-                report.append(
-                    f"- Line {item['line']}: `[{item['text']}]({item['url']})`"
-                )
-                report.append(f"  - Reason: {item.get('reason', 'unknown')}")
+                    out.write(f"\n### {current_file}\n\n")
+                out.write(f"- Line {item['line']}: `[{item['text']}]({item['url']})`\n")
+                out.write(f"  - Reason: {item.get('reason', 'unknown')}\n")
                 if "suggested" in item:
-                    report.append(f"  - Suggested: `{item['suggested']}`")
+                    out.write(f"  - Suggested: `{item['suggested']}`\n")
 
         # Still broken links
-        if self.link_report["broken"]:
-            report.append("\n## Remaining Broken Links\n")
+        if counts["broken"]:
+            out.write("\n## Remaining Broken Links\n")
             current_file = None
-            for item in sorted(
-                self.link_report["broken"], key=lambda x: (x["file"], x["line"])
-            ):
+            for item in self.reporter.iter_records("broken"):
                 if current_file != item["file"]:
                     current_file = item["file"]
-                    report.append(f"\n### {current_file}\n")
-                report.append(
-                    f"- Line {item['line']}: `[{item['text']}]({item['url']})`"
-                )
-                report.append(f"  - Reason: {item.get('reason', 'unknown')}")
+                    out.write(f"\n### {current_file}\n\n")
+                out.write(f"- Line {item['line']}: `[{item['text']}]({item['url']})`\n")
+                out.write(f"  - Reason: {item.get('reason', 'unknown')}\n")
 
         # Example fixes
-        if self.fixes_applied:
-            report.append("\n## Before/After Examples\n")
-            for i, fix in enumerate(self.fixes_applied[:5], 1):  # Show first 5 examples
-                report.append(f"\n### Example {i}")
-                report.append(f"**File:** `{fix['file']}` (Line {fix['line']})")
-                report.append("\n**Before:**")
-                report.append("```markdown")
-                report.append(f"[{fix['text']}]({fix['old_url']})")
-                report.append("```")
-                report.append("\n**After:**")
-                report.append("```markdown")
-                report.append(f"[{fix['text']}]({fix['new_url']})")
-                report.append("```")
-
-        return "\n".join(report)
+        if examples:
+            out.write("\n## Before/After Examples\n")
+            for i, fix in enumerate(examples, 1):
+                out.write(f"\n### Example {i}\n")
+                out.write(f"**File:** `{fix['file']}` (Line {fix['line']})\n")
+                out.write("\n**Before:**\n")
+                out.write("```markdown\n")
+                out.write(f"[{fix['text']}]({fix['old_url']})\n")
+                out.write("```\n")
+                out.write("\n**After:**\n")
+                out.write("```markdown\n")
+                out.write(f"[{fix['text']}]({fix['new_url']})\n")
+                out.write("```\n")
 
 
 def main():
     docs_root = Path("/home/eirikr/Playground/gnu-hurd-docker/docs")
-    scanner = LinkScanner(docs_root)
+    ndjson_path = docs_root / "link-fix-data.ndjson"
 
     print("Starting link scan and fix process...")
     print(f"Scanning directory: {docs_root}")
+    print(f"Streaming results to: {ndjson_path}")
 
-    total, broken, fixed = scanner.scan_and_fix()
+    with LinkReporter(ndjson_path) as reporter:
+        scanner = LinkScanner(docs_root, reporter)
+        total, broken, fixed = scanner.scan_and_fix()
 
     print("\nScan complete:")
     print(f"  Total internal links: {total}")
     print(f"  Broken links found: {broken}")
     print(f"  Links fixed: {fixed}")
-    print(f"  Manual review needed: {len(scanner.manual_review)}")
+    print(f"  Manual review needed: {reporter.counts['manual_review']}")
 
-    # Generate and save report
-    report = scanner.generate_report(total, broken, fixed)
+    # Build the markdown report from the stream
     report_path = docs_root / "LINK-FIX-REPORT.md"
-
     with open(report_path, "w", encoding="utf-8") as f:
-        f.write(report)
+        scanner.write_report(f, total, broken, fixed)
 
     print(f"\nReport saved to: {report_path}")
-
-    # Also save JSON data for further processing if needed
-    json_data = {
-        "summary": {
-            "total_links": total,
-            "broken_links": broken,
-            "fixed_links": fixed,
-            "manual_review": len(scanner.manual_review),
-        },
-        "fixes_applied": scanner.fixes_applied,
-        "manual_review": scanner.manual_review,
-        "broken_links": scanner.link_report["broken"],
-    }
-
-    json_path = docs_root / "link-fix-data.json"
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, indent=2)
-
-    print(f"JSON data saved to: {json_path}")
+    print(f"NDJSON data saved to: {ndjson_path}")
 
 
 if __name__ == "__main__":